@@ -3,23 +3,225 @@ Build PMTiles from Processed GeoJSON Data
 Unified script that creates PMTiles with speed and road quality data
 """
 
+import hashlib
+import json
+import os
+import shutil
 import subprocess
 import sys
+import tempfile
+import threading
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+MANIFEST_FILE = Path(".pmtiles_manifest.json")
+
+# Everything except the output file; a change here invalidates incremental builds
+TIPPECANOE_OPTIONS = [
+    '--maximum-zoom=16',
+    '--minimum-zoom=10',
+    '--drop-densest-as-needed',
+    '--extend-zooms-if-still-dropping',
+    # Features arrive on stdin, one per line; each carries its own
+    # per-trip layer name via the "tippecanoe" feature extension
+    '--read-parallel',
+    '--include=Speed',
+    '--include=road_quality',
+    '--include=marker',
+    '--include=trip_id'
+]
+
 def check_command(cmd):
-    """Check if a command is available"""
+    """Check if a command is available on PATH"""
+    return shutil.which(cmd) is not None
+
+def find_processed_files(processed_dir):
+    """Find all processed trip files, using fd's native parallel walker when available"""
+    fd = shutil.which('fd') or shutil.which('fdfind')  # Debian/Ubuntu name it fdfind
+    if fd:
+        try:
+            result = subprocess.run(
+                [fd, '--type', 'f', '--no-ignore', '--hidden',
+                 '--glob', '*_processed.geojson', str(processed_dir)],
+                capture_output=True, text=True, check=True, close_fds=False
+            )
+            return [Path(p) for p in result.stdout.splitlines()]
+        except subprocess.CalledProcessError:
+            pass  # Fall back to the Python walk below
+    
+    return list(processed_dir.rglob("*_processed.geojson"))
+
+def read_trip_features(geojson_file):
+    """Read one processed trip and return its features as newline-delimited JSON
+    
+    Each feature is tagged with the tippecanoe layer extension so every trip
+    keeps its own layer (named after the file, as app.js expects)
+    """
+    layer = geojson_file.stem
+    with open(geojson_file, 'r') as f:
+        data = json.load(f)
+    
+    lines = []
+    for feature in data.get('features', []):
+        feature['tippecanoe'] = {'layer': layer}
+        lines.append(json.dumps(feature, separators=(',', ':')))
+        lines.append('\n')
+    return ''.join(lines).encode()
+
+def forward_output(stream, tail):
+    """Echo a subprocess's output as it arrives, remembering the last lines in tail"""
+    for line in stream:
+        sys.stderr.buffer.write(line)
+        sys.stderr.buffer.flush()
+        tail.append(line.decode(errors='replace'))
+
+def read_in_order(pool, geojson_files, window):
+    """Yield read_trip_features() of each file in order, reading ahead in pool
+    
+    At most window files are being read or waiting to be written at any
+    time, so memory stays bounded however many trips there are
+    """
+    pending = deque()
+    files = iter(geojson_files)
+    for geojson_file in files:
+        pending.append(pool.submit(read_trip_features, geojson_file))
+        if len(pending) >= window:
+            break
+    
+    while pending:
+        chunk = pending.popleft().result()
+        next_file = next(files, None)
+        if next_file is not None:
+            pending.append(pool.submit(read_trip_features, next_file))
+        yield chunk
+
+def stream_to_tippecanoe(cmd, geojson_files):
+    """Run tippecanoe reading features from stdin while files are parsed in parallel
+    
+    tippecanoe's log is shown live rather than buffered in memory.
+    Returns (returncode, last lines of the log)
+    """
+    tail = deque(maxlen=20)
+    sys.stdout.flush()  # Keep our progress lines ahead of tippecanoe's log
+    # An absolute cmd[0] plus close_fds=False lets subprocess use posix_spawn
+    # instead of fork+exec; our own descriptors are non-inheritable anyway (PEP 446)
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE,
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            close_fds=False)
+    reader = threading.Thread(target=forward_output, args=(proc.stdout, tail), daemon=True)
+    reader.start()
     try:
-        if cmd == 'pmtiles':
-            subprocess.run([cmd], capture_output=True)
-            return True
-        else:
-            subprocess.run([cmd, '--version'], capture_output=True, check=True)
-            return True
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        return False
-
-def main():
+        # Chunks come back in order, so the main thread is the single stdin writer
+        workers = os.cpu_count() or 1
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for chunk in read_in_order(pool, geojson_files, 2 * workers):
+                proc.stdin.write(chunk)
+    except BrokenPipeError:
+        pass  # tippecanoe exited early; its log explains why
+    except BaseException:
+        # A clean EOF would let tippecanoe finish tiles from only part of the
+        # trips, so stop it before passing the error on
+        proc.kill()
+        proc.wait()
+        reader.join()
+        raise
+    finally:
+        try:
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+    
+    returncode = proc.wait()
+    reader.join()
+    return returncode, ''.join(tail)
+
+def file_sha256(path):
+    """SHA-256 hex digest of a file"""
+    with open(path, 'rb') as f:
+        if hasattr(hashlib, 'file_digest'):  # Python 3.11+
+            return hashlib.file_digest(f, 'sha256').hexdigest()
+        return hashlib.sha256(f.read()).hexdigest()
+
+def file_record(path, previous=None):
+    """Manifest entry for a trip file: its size, mtime and SHA-256
+    
+    The hash of previous (an entry from the last manifest) is reused when
+    the file's size and mtime are unchanged, so unchanged files aren't read
+    """
+    st = os.stat(path)
+    if (isinstance(previous, dict)
+            and previous.get('size') == st.st_size
+            and previous.get('mtime_ns') == st.st_mtime_ns):
+        return previous
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha256': file_sha256(path)}
+
+def record_digest(record):
+    """SHA-256 of a manifest entry (manifests from older builds stored just the digest)"""
+    return record.get('sha256') if isinstance(record, dict) else record
+
+def load_manifest():
+    """Load the record of which trip files went into the current PMTiles"""
+    if not MANIFEST_FILE.exists():
+        return {}
+    try:
+        with open(MANIFEST_FILE, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(records):
+    """Record the tippecanoe options and trip files used for the current PMTiles"""
+    with open(MANIFEST_FILE, 'w') as f:
+        json.dump({'options': TIPPECANOE_OPTIONS, 'files': records}, f, indent=2)
+
+def run_tippecanoe(output_file, geojson_files):
+    """Tile geojson_files into output_file (PMTiles, chosen by the .pmtiles extension)
+    
+    tippecanoe writes to a temporary file that only replaces output_file
+    once it succeeded, so a failed run never leaves partial tiles behind
+    """
+    with tempfile.TemporaryDirectory(dir=output_file.parent) as tmp_dir:
+        tmp_output = Path(tmp_dir) / output_file.name
+        cmd = [shutil.which('tippecanoe'), '--output', str(tmp_output), '--force']
+        cmd.extend(TIPPECANOE_OPTIONS)
+        
+        returncode, tail = stream_to_tippecanoe(cmd, geojson_files)
+        if returncode != 0:
+            print(f"   ❌ Error: tippecanoe failed (exit code {returncode})")
+            print(f"\nLast output:\n{tail}")
+            return False
+        os.replace(tmp_output, output_file)
+    return True
+
+def merge_new_trips(output_file, new_files):
+    """Tile only new_files and merge them into the existing output_file with tile-join"""
+    # Temp files live next to the output so the final rename stays on one filesystem
+    with tempfile.TemporaryDirectory(dir=output_file.parent) as tmp_dir:
+        new_tiles = Path(tmp_dir) / "new_trips.pmtiles"
+        merged = Path(tmp_dir) / "merged.pmtiles"
+        
+        if not run_tippecanoe(new_tiles, new_files):
+            return False
+        
+        print("\n🧩 Merging into existing tiles with tile-join...")
+        try:
+            subprocess.run([
+                shutil.which('tile-join'),
+                '--output', str(merged),
+                '--force',
+                '--no-tile-size-limit',
+                str(output_file),
+                str(new_tiles)
+            ], check=True, close_fds=False)
+        except subprocess.CalledProcessError as e:
+            print(f"   ❌ Error: tile-join failed (exit code {e.returncode})")
+            return False
+        
+        os.replace(merged, output_file)
+    return True
+
+def main(full_rebuild=False):
     print("🚴 Building PMTiles from Processed Data")
     print("=" * 60)
     
@@ -34,17 +236,9 @@ def main():
         return 1
     print("  ✅ tippecanoe found")
     
-    if not check_command('pmtiles'):
-        print("❌ Error: pmtiles not found")
-        print("\nInstall instructions:")
-        print("  brew install pmtiles")
-        return 1
-    print("  ✅ pmtiles found")
-    
     # Set paths
     processed_dir = Path("processed_sensor_data")
     output_file = Path("trips.pmtiles")
-    temp_mbtiles = Path("trips.mbtiles")
     
     # Check input directory
     if not processed_dir.exists():
@@ -54,7 +248,7 @@ def main():
     
     # Count files 
     print(f"\n📂 Scanning {processed_dir}...")
-    geojson_files = list(processed_dir.rglob("*_processed.geojson"))
+    geojson_files = find_processed_files(processed_dir)
     
     if len(geojson_files) == 0:
         print(f"❌ No processed files found in {processed_dir}")
@@ -63,73 +257,66 @@ def main():
     
     print(f"📊 Found {len(geojson_files)} processed trip files")
     
+    # Largest trips first, so the longest reads start early and don't
+    # leave the reader pool waiting on one big file at the end
+    geojson_files.sort(key=lambda p: p.stat().st_size, reverse=True)
+    
     # Show breakdown by sensor
-    sensors = {}
-    for f in geojson_files:
-        sensor = f.parent.name
-        sensors[sensor] = sensors.get(sensor, 0) + 1
+    sensors = Counter(f.parent.name for f in geojson_files)
     
     for sensor, count in sorted(sensors.items()):
         print(f"   {sensor}: {count} trips")
     
-    # Remove old files
-    print("\n🗑️  Cleaning up old files...")
-    if output_file.exists():
-        output_file.unlink()
-        print(f"   Removed old {output_file}")
-    if temp_mbtiles.exists():
-        temp_mbtiles.unlink()
-        print(f"   Removed old {temp_mbtiles}")
-    
-    # Build with tippecanoe
-    print("\n🔨 Building MBTiles with tippecanoe...")
-    print("   This may take a few minutes...")
-    
-    cmd = [
-        'tippecanoe',
-        '--output', str(temp_mbtiles),
-        '--force',
-        '--maximum-zoom=16',
-        '--minimum-zoom=10',
-        '--drop-densest-as-needed',
-        '--extend-zooms-if-still-dropping',
-        # No --layer flag - let tippecanoe create layers from filenames
-        '--include=Speed',
-        '--include=road_quality',
-        '--include=marker',
-        '--include=trip_id'
-    ]
-    
-    # Add all geojson files
-    cmd.extend([str(f) for f in geojson_files])
+    # Compare against the trips that went into the previous build
+    print("\n🔎 Checking for changes since the last build...")
+    manifest = load_manifest()
+    previous = manifest.get('files', {})
     
-    try:
-        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
-        print("   ✅ MBTiles created successfully")
-    except subprocess.CalledProcessError as e:
-        print(f"   ❌ Error: tippecanoe failed")
-        print(f"\nError output:\n{e.stderr}")
-        return 1
+    # Only files whose size or mtime changed are read and hashed
+    paths = [str(f) for f in geojson_files]
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as pool:
+        records = dict(zip(paths, pool.map(lambda path: file_record(path, previous.get(path)), paths)))
     
-    # Convert to PMTiles
-    print("\n📦 Converting MBTiles to PMTiles format...")
-    try:
-        subprocess.run([
-            'pmtiles', 'convert',
-            str(temp_mbtiles),
-            str(output_file)
-        ], check=True, capture_output=True)
+    new_files = [f for f in geojson_files if str(f) not in previous]
+    
+    # Tiles can only be added to, so any changed or removed trip (or changed
+    # tippecanoe options) needs a full rebuild
+    can_append = (not full_rebuild
+                  and output_file.exists()
+                  and manifest.get('options') == TIPPECANOE_OPTIONS
+                  and all(path in records and record_digest(records[path]) == record_digest(record)
+                          for path, record in previous.items()))
+    
+    if can_append and not new_files:
+        print(f"   ✅ {output_file} is up to date, nothing to rebuild")
+        output_file.touch()  # Trip files were only touched; mark the tiles current too
+    elif can_append and check_command('tile-join'):
+        print(f"   {len(new_files)} new trips, {len(previous)} unchanged")
+        
+        print(f"\n🔨 Building PMTiles for {len(new_files)} new trips with tippecanoe...")
+        if not merge_new_trips(output_file, new_files):
+            return 1
+        print("   ✅ PMTiles updated successfully")
+    else:
+        print("   Full rebuild required")
+        
+        # Remove old files; the manifest goes first, so if this rebuild
+        # fails the next run can't take leftover tiles for a finished build
+        print("\n🗑️  Cleaning up old files...")
+        MANIFEST_FILE.unlink(missing_ok=True)
+        if output_file.exists():
+            output_file.unlink()
+            print(f"   Removed old {output_file}")
+        
+        # Build with tippecanoe
+        print("\n🔨 Building PMTiles with tippecanoe...")
+        print("   This may take a few minutes...")
+        
+        if not run_tippecanoe(output_file, geojson_files):
+            return 1
         print("   ✅ PMTiles created successfully")
-    except subprocess.CalledProcessError as e:
-        print(f"   ❌ Error: PMTiles conversion failed")
-        print(f"\nError output:\n{e.stderr}")
-        return 1
     
-    # Clean up temporary file
-    print("\n🗑️  Cleaning up temporary files...")
-    if temp_mbtiles.exists():
-        temp_mbtiles.unlink()
-        print(f"   Removed {temp_mbtiles}")
+    save_manifest(records)
     
     # Show results
     size_mb = output_file.stat().st_size / (1024 * 1024)
@@ -148,4 +335,5 @@ def main():
     return 0
 
 if __name__ == "__main__":
-    sys.exit(main())
\ No newline at end of file
+    # --full ignores the manifest and retiles every trip
+    sys.exit(main(full_rebuild='--full' in sys.argv[1:]))
\ No newline at end of file
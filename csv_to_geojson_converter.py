@@ -106,45 +106,49 @@ def main():
     else:
         all_metadata = {}
 
-    for entry in os.listdir(INPUT_ROOT):
-        entry_path = os.path.join(INPUT_ROOT, entry)
-
-        # If it's a folder, look for CSVs inside it
-        if os.path.isdir(entry_path):
-            csv_files = [os.path.join(entry_path, f) for f in os.listdir(entry_path) if f.lower().endswith(".csv")]
-        # If it's a CSV directly in csv_data/, process it directly
-        elif entry.lower().endswith(".csv"):
-            csv_files = [entry_path]
-        else:
-            continue
+    try:
+        for entry in os.scandir(INPUT_ROOT):
+            # If it's a folder, look for CSVs inside it
+            if entry.is_dir():
+                csv_files = [f.path for f in os.scandir(entry.path)
+                             if f.is_file() and f.name.lower().endswith(".csv")]
+            # If it's a CSV directly in csv_data/, process it directly
+            elif entry.name.lower().endswith(".csv"):
+                csv_files = [entry.path]
+            else:
+                continue
+
+            for input_file in csv_files:
+                file = os.path.basename(input_file)
+                sensor_id = file[:5]
 
-        for input_file in csv_files:
-            file = os.path.basename(input_file)
-            sensor_id = file[:5]
+                # Create output folder per sensor ID
+                sensor_output = os.path.join(OUTPUT_ROOT, sensor_id)
+                os.makedirs(sensor_output, exist_ok=True)
 
-            # Create output folder per sensor ID
-            sensor_output = os.path.join(OUTPUT_ROOT, sensor_id)
-            os.makedirs(sensor_output, exist_ok=True)
+                trip_num = get_next_trip_number(sensor_output)
+                trip_id = f"{sensor_id}_Trip{trip_num}"
 
-            trip_num = get_next_trip_number(sensor_output)
-            trip_id = f"{sensor_id}_Trip{trip_num}"
+                features, metadata = process_csv(input_file, sensor_id, trip_num)
 
-            features, metadata = process_csv(input_file, sensor_id, trip_num)
+                geojson = {"type": "FeatureCollection", "features": features}
+                out_geojson = os.path.join(sensor_output, f"{trip_id}_clean.geojson")
+                with open(out_geojson, "w", encoding="utf-8") as f:
+                    json.dump(geojson, f, indent=2)
 
-            geojson = {"type": "FeatureCollection", "features": features}
-            out_geojson = os.path.join(sensor_output, f"{trip_id}_clean.geojson")
-            with open(out_geojson, "w", encoding="utf-8") as f:
-                json.dump(geojson, f, indent=2)
+                # Save metadata in the flat structure (not nested in "metadata")
+                trip_metadata = {"source_file": file}
+                trip_metadata.update(metadata)
+                all_metadata[trip_id] = trip_metadata
 
-            # Save metadata in the flat structure (not nested in "metadata")
-            trip_metadata = {"source_file": file}
-            trip_metadata.update(metadata)
-            all_metadata[trip_id] = trip_metadata
-            
-            with open(metadata_index_file, "w", encoding="utf-8") as f:
-                json.dump(all_metadata, f, indent=2)
+                print(f"✅ {file} → {trip_id}_clean.geojson in {sensor_output}")
+    finally:
+        # Write the index once at the end (even if a later CSV fails)
+        # instead of rewriting the whole file after every trip
+        with open(metadata_index_file, "w", encoding="utf-8") as f:
+            json.dump(all_metadata, f, indent=2)
 
-            print(f"✅ {file} → {trip_id}_clean.geojson in {sensor_output}")
+    return 0
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -6,48 +6,52 @@ a static JSON file with pre-computed scores for web visualization.
 Usage: python generate_traffic_light_analysis.py
 """
 
-import json
+import hashlib
+import heapq
 import math
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 from pathlib import Path
 from collections import defaultdict
 
-# ANSI color codes
-class Colors:
-    HEADER = '\033[95m'
-    BLUE = '\033[94m'
-    CYAN = '\033[96m'
-    GREEN = '\033[92m'
-    YELLOW = '\033[93m'
-    RED = '\033[91m'
-    END = '\033[0m'
-    BOLD = '\033[1m'
+from pipeline_core import (
+    VERBOSE, Colors, print_error, print_header, print_info, print_success, read_json, write_json
+)
 
-def print_header(text):
-    print(f"\n{Colors.HEADER}{Colors.BOLD}{'=' * 70}{Colors.END}")
-    print(f"{Colors.HEADER}{Colors.BOLD}{text.center(70)}{Colors.END}")
-    print(f"{Colors.HEADER}{Colors.BOLD}{'=' * 70}{Colors.END}\n")
+EARTH_RADIUS_M = 6371000
 
-def print_success(text):
-    print(f"{Colors.GREEN}✅ {text}{Colors.END}")
+# Point index of the last analyzed trips, reused while the trip files are unchanged
+POINT_CACHE_FILE = Path(".traffic_light_points.npz")
+POINT_CACHE_VERSION = 1  # Bump when the point index layout changes
 
-def print_error(text):
-    print(f"{Colors.RED}❌ {text}{Colors.END}")
+# Each light takes well under a millisecond, so worker processes only pay
+# off with at least this many lights for each of them
+LIGHTS_PER_WORKER = 2000
 
-def print_info(text):
-    print(f"{Colors.BLUE}ℹ️  {text}{Colors.END}")
+# Point index of a worker process, set once by init_worker
+_worker_points = None
 
-def haversine_distance(lon1, lat1, lon2, lat2):
-    """Calculate distance between two points in meters"""
-    R = 6371000  # Earth radius in meters
+def haversine_distance(lon1, lat1, lon2, lat2, cos_lat1=None, cos_lat2=None):
+    """Calculate distance between two points in meters
     
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    delta_phi = math.radians(lat2 - lat1)
-    delta_lambda = math.radians(lon2 - lon1)
+    lon2/lat2 may be NumPy arrays, giving the distances from (lon1, lat1)
+    to every point in one vectorized call. The cosines of the latitudes
+    can be passed in when the caller already has them.
+    """
+    R = EARTH_RADIUS_M
+    
+    if cos_lat1 is None:
+        cos_lat1 = math.cos(math.radians(lat1))
+    if cos_lat2 is None:
+        cos_lat2 = np.cos(np.radians(lat2))
+    delta_phi = np.radians(lat2 - lat1)
+    delta_lambda = np.radians(lon2 - lon1)
     
-    a = math.sin(delta_phi/2)**2 + \
-        math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda/2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+    a = np.sin(delta_phi/2)**2 + \
+        cos_lat1 * cos_lat2 * np.sin(delta_lambda/2)**2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1-a))
     
     return R * c
 
@@ -61,66 +65,208 @@ def load_traffic_lights():
         'data/traffic_lights.json'
     ]
     
-    for path in possible_paths:
-        if Path(path).exists():
-            print_success(f"Loading traffic lights from: {path}")
-            with open(path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return data
+    path = next((path for path in possible_paths if Path(path).exists()), None)
+    if path is not None:
+        print_success(f"Loading traffic lights from: {path}")
+        return read_json(path)
     
     print_error("Traffic lights file not found!")
     print_info("Looking for: traffic_lights.json, verkeerslichten.geojson, or traffic_lights.geojson")
     return None
 
-def load_processed_trips():
-    """Load all processed trip GeoJSON files"""
-    trips = []
+def trip_point_arrays(trip_data):
+    """
+    Flatten a trip's features into per-point NumPy arrays
+    
+    Returns:
+        (lons, lats, speeds, has_prev): has_prev is True for LineString
+        points that follow another point of the same line, the only points
+        that can count as entering a zone; Point features never do
+    """
+    points = []
+    speeds = []      # One speed per feature, shared by all of its points
+    counts = []      # Number of points of each feature
+    is_line = []
+    
+    for feature in trip_data.get('features', []):
+        geometry_type = feature['geometry']['type']
+        if geometry_type == 'LineString':
+            coords = feature['geometry']['coordinates']
+        elif geometry_type == 'Point':
+            coords = [feature['geometry']['coordinates']]
+        else:
+            continue
+        
+        props = feature['properties']
+        speeds.append(props.get('Speed', props.get('speed', 0)))
+        counts.append(len(coords))
+        is_line.append(geometry_type == 'LineString')
+        points.extend(coords)
+    
+    counts = np.array(counts, dtype=np.intp)
+    
+    # Spread the per-feature values over the points; the first point of
+    # every feature has no previous point on the same line
+    has_prev = np.repeat(np.array(is_line, dtype=bool), counts)
+    first_points = (np.cumsum(counts) - counts)[counts > 0]
+    has_prev[first_points] = False
+    
+    return (np.array([point[0] for point in points], dtype=np.float64),
+            np.array([point[1] for point in points], dtype=np.float64),
+            np.repeat(np.array(speeds, dtype=np.float64), counts),
+            has_prev)
+
+def find_processed_trip_files():
+    """Find all processed trip GeoJSON files"""
     processed_dir = Path('processed_sensor_data')
     
     if not processed_dir.exists():
         print_error(f"Directory not found: {processed_dir}")
         return []
     
-    # Look for files in both root and nested sensor folders
+    # Look for files in both root and nested sensor folders, listing each
+    # directory only once
     geojson_files = []
+    for entry in processed_dir.iterdir():
+        if entry.is_dir():
+            # Files in sensor subfolders (e.g., processed_sensor_data/602B3/*.geojson)
+            geojson_files.extend(entry.glob('*.geojson'))
+        elif entry.name.endswith('_processed.geojson'):
+            # Files directly in processed_sensor_data/
+            geojson_files.append(entry)
     
-    # Pattern 1: Files directly in processed_sensor_data/
-    geojson_files.extend(list(processed_dir.glob('*_processed.geojson')))
-    
-    # Pattern 2: Files in sensor subfolders (e.g., processed_sensor_data/602B3/*.geojson)
-    geojson_files.extend(list(processed_dir.glob('*/*.geojson')))
-    
-    # Pattern 3: Files with _processed in sensor subfolders
-    geojson_files.extend(list(processed_dir.glob('*/*_processed.geojson')))
-    
-    # Remove duplicates
-    geojson_files = list(set(geojson_files))
+    geojson_files.sort()
     
     print_info(f"Found {len(geojson_files)} processed trip files")
+    return geojson_files
+
+def load_processed_trips(geojson_files):
+    """Load processed trip GeoJSON files as per-point arrays
+    
+    Only the arrays are kept, so each trip's parsed feature tree can be
+    freed as soon as its points have been extracted.
+    """
+    trips = []
+    processed_dir = Path('processed_sensor_data')
     
     for file_path in geojson_files:
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                trip_data = json.load(f)
-                trips.append({
-                    'name': file_path.stem,
-                    'data': trip_data,
-                    'path': str(file_path)
-                })
+            lons, lats, speeds, has_prev = trip_point_arrays(read_json(file_path))
+            trips.append({
+                'name': file_path.stem,
+                'path': str(file_path),
+                'lons': lons,
+                'lats': lats,
+                'speeds': speeds,
+                'has_prev': has_prev
+            })
+            if VERBOSE:
                 print_success(f"Loaded: {file_path.relative_to(processed_dir)}")
         except Exception as e:
             print_error(f"Failed to load {file_path.name}: {e}")
     
     return trips
 
-def analyze_traffic_light(light_coords, trips, radius=25):
+def build_point_index(trips):
+    """
+    Flatten the points of all trips into one set of contiguous arrays that
+    every traffic light is checked against
+    
+    Each trip starts with has_prev False, so a zone entry is never counted
+    across two trips. The latitude-sorted order lets each light look at
+    only the narrow band of points that can possibly be in range.
+    """
+    lats = np.concatenate([trip['lats'] for trip in trips])
+    lat_order = np.argsort(lats, kind='stable')
+    
+    # Cosines of the point latitudes are the same for every light
+    cos_lats = np.cos(np.radians(lats))
+    lons = np.concatenate([trip['lons'] for trip in trips])
+    
+    return {
+        'lons': lons,
+        'lats': lats,
+        'cos_lats': cos_lats,
+        'speeds': np.concatenate([trip['speeds'] for trip in trips]),
+        'has_prev': np.concatenate([trip['has_prev'] for trip in trips]),
+        'lat_order': lat_order,
+        'sorted_lats': lats[lat_order],
+        # Longitudes in int32 micro-degrees, in latitude order, for a compact
+        # contiguous prescreen of each light's latitude band
+        'sorted_lons_e6': np.round(lons[lat_order] * 1e6).astype(np.int32)
+    }
+
+def point_cache_key(geojson_files):
+    """Digest of the trip files' paths, sizes and modification times"""
+    h = hashlib.blake2b(f"v{POINT_CACHE_VERSION}".encode())
+    for path in geojson_files:
+        st = os.stat(path)
+        h.update(f"\n{path}:{st.st_mtime_ns}:{st.st_size}".encode())
+    return h.hexdigest()
+
+def load_point_cache(key):
+    """Return (trip count, point index) saved for key, or None"""
+    if not POINT_CACHE_FILE.exists():
+        return None
+    try:
+        with np.load(POINT_CACHE_FILE) as cache:
+            if str(cache['key']) != key:
+                return None
+            points = {name: cache[name] for name in cache.files if name not in ('key', 'trip_count')}
+            return int(cache['trip_count']), points
+    except Exception:
+        return None  # Unreadable cache, just rebuild it
+
+def save_point_cache(key, trip_count, points):
+    """Save the point index for key, replacing the previous cache atomically"""
+    fd, tmp_path = tempfile.mkstemp(dir=POINT_CACHE_FILE.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, key=key, trip_count=trip_count, **points)
+        os.replace(tmp_path, POINT_CACHE_FILE)
+    except OSError as e:
+        print_error(f"Could not save point cache: {e}")
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)  # Not replaced: saving failed or was interrupted
+
+def load_trip_points():
+    """
+    Load the point index of all processed trips, from the cache when no
+    trip file has changed since it was saved
+    
+    Returns:
+        (number of trips, point index), with a None index if there are no trips
+    """
+    geojson_files = find_processed_trip_files()
+    if not geojson_files:
+        return 0, None
+    
+    key = point_cache_key(geojson_files)
+    cached = load_point_cache(key)
+    if cached is not None:
+        print_success(f"Trip files unchanged, loaded points from {POINT_CACHE_FILE}")
+        return cached
+    
+    trips = load_processed_trips(geojson_files)
+    if not trips:
+        return 0, None
+    
+    points = build_point_index(trips)
+    # A cache hit would leave out the trips that failed to load without
+    # showing their errors again, so only cache complete loads
+    if len(trips) == len(geojson_files):
+        save_point_cache(key, len(trips), points)
+    return len(trips), points
+
+def analyze_traffic_light(light_coords, points, radius=25):
     """
     Analyze cyclist behavior at a single traffic light across all trips
     Uses the EXACT same logic as app.js analyzeTrafficLights() function
     
     Args:
         light_coords: [lon, lat] of traffic light
-        trips: List of trip data
+        points: Point arrays of all trips, from build_point_index()
         radius: Detection radius in meters (default 25m - matches app.js ANALYSIS_RADIUS)
     
     Returns:
@@ -128,64 +274,59 @@ def analyze_traffic_light(light_coords, trips, radius=25):
     """
     lon, lat = light_coords
     
-    sudden_brake_count = 0
-    extended_stop_count = 0
-    total_points_checked = 0
-    
     # Speed thresholds - MATCH app.js exactly
     SLOW_SPEED_THRESHOLD = 2  # km/h - considered "stopped" (matches app.js)
     ENTRY_BRAKE_THRESHOLD = 5  # km/h - sudden brake if entering zone at this speed (matches app.js logic)
     
-    # Process each trip
-    for trip in trips:
-        features = trip['data'].get('features', [])
-        
-        for feature in features:
-            # Handle both LineString and Point geometries
-            if feature['geometry']['type'] == 'LineString':
-                coords = feature['geometry']['coordinates']
-                props = feature['properties']
-                
-                # Check each point in the line
-                for i in range(len(coords)):
-                    point_lon, point_lat = coords[i][0], coords[i][1]
-                    distance = haversine_distance(lon, lat, point_lon, point_lat)
-                    
-                    # If within analysis radius
-                    if distance <= radius:
-                        total_points_checked += 1
-                        
-                        # Get speed at this point
-                        speed = props.get('Speed', props.get('speed', 0))
-                        
-                        # Check for sudden braking (matches app.js logic)
-                        # "If we just entered the zone and speed is low, it's a brake event"
-                        if i > 0:
-                            prev_lon, prev_lat = coords[i-1][0], coords[i-1][1]
-                            prev_distance = haversine_distance(lon, lat, prev_lon, prev_lat)
-                            
-                            # Previous point was outside, current is inside, and speed is low
-                            if prev_distance > radius and speed < ENTRY_BRAKE_THRESHOLD:
-                                sudden_brake_count += 1
-                        
-                        # Check for extended stop (very low speed)
-                        # Matches app.js: "if (speed < SLOW_SPEED_THRESHOLD)"
-                        if speed < SLOW_SPEED_THRESHOLD:
-                            extended_stop_count += 1
-            
-            elif feature['geometry']['type'] == 'Point':
-                # Handle Point features (some GeoJSON files use Points)
-                point_coords = feature['geometry']['coordinates']
-                point_lon, point_lat = point_coords[0], point_coords[1]
-                distance = haversine_distance(lon, lat, point_lon, point_lat)
-                
-                if distance <= radius:
-                    total_points_checked += 1
-                    props = feature['properties']
-                    speed = props.get('Speed', props.get('speed', 0))
-                    
-                    if speed < SLOW_SPEED_THRESHOLD:
-                        extended_stop_count += 1
+    # Haversine distance is at least R * |delta_phi|, so no point further
+    # than this from the light's latitude can be within the radius
+    lat_margin = math.degrees(radius / EARTH_RADIUS_M) * 1.000001
+    
+    # Squared distance (degrees of latitude) with a 1% margin for the
+    # flat-earth approximation, which is far more accurate than that at
+    # these distances
+    prefilter_limit = (1.01 * math.degrees(radius / EARTH_RADIUS_M))**2
+    cos_lat = math.cos(math.radians(lat))
+    
+    # Widest longitude difference a point within the radius can have at
+    # these latitudes, in micro-degrees plus one for the rounding of both ends
+    band_cos = math.cos(math.radians(min(abs(lat) + lat_margin, 90)))
+    if band_cos > 1e-6:
+        lon_margin_e6 = math.ceil(1.01 * lat_margin / band_cos * 1e6) + 1
+    else:
+        lon_margin_e6 = 360 * 10**6  # At the poles every longitude is close
+    
+    # Check only the points in the latitude band whose longitude is close
+    lo, hi = np.searchsorted(points['sorted_lats'], [lat - lat_margin, lat + lat_margin])
+    band_lons = points['sorted_lons_e6'][lo:hi]
+    near = np.abs(band_lons - round(lon * 1e6)) <= lon_margin_e6
+    candidates = points['lat_order'][lo:hi][near]
+    
+    # Cheap equirectangular check drops the band's points that are clearly
+    # out of range, so exact haversine distances are only computed near the light
+    dlon = (points['lons'][candidates] - lon) * cos_lat
+    dlat = points['lats'][candidates] - lat
+    candidates = candidates[dlon * dlon + dlat * dlat <= prefilter_limit]
+    distances = haversine_distance(lon, lat, points['lons'][candidates], points['lats'][candidates],
+                                   cos_lat, points['cos_lats'][candidates])
+    
+    # If within analysis radius
+    in_zone = candidates[distances <= radius]
+    total_points_checked = len(in_zone)
+    speeds = points['speeds'][in_zone]
+    
+    # Check for sudden braking (matches app.js logic)
+    # "If we just entered the zone and speed is low, it's a brake event":
+    # previous point of the same line was outside, current is inside
+    slow_entries = in_zone[points['has_prev'][in_zone] & (speeds < ENTRY_BRAKE_THRESHOLD)]
+    prev_distances = haversine_distance(lon, lat, points['lons'][slow_entries - 1],
+                                        points['lats'][slow_entries - 1],
+                                        cos_lat, points['cos_lats'][slow_entries - 1])
+    sudden_brake_count = int(np.count_nonzero(prev_distances > radius))
+    
+    # Check for extended stop (very low speed)
+    # Matches app.js: "if (speed < SLOW_SPEED_THRESHOLD)"
+    extended_stop_count = int(np.count_nonzero(speeds < SLOW_SPEED_THRESHOLD))
     
     # Calculate scores (0-100) - MATCH app.js scoring exactly
     # "More events = higher score (worse)"
@@ -221,6 +362,39 @@ def analyze_traffic_light(light_coords, trips, radius=25):
         'overall_score': round(overall_score, 2)
     }
 
+def init_worker(points):
+    """Keep the point index in the worker process for all its batches"""
+    global _worker_points
+    _worker_points = points
+
+def analyze_light_batch(light_coords):
+    """Analyze a batch of traffic lights in a worker process"""
+    return [analyze_traffic_light(coords, _worker_points) for coords in light_coords]
+
+def analyze_traffic_lights(light_coords, points):
+    """
+    Analyze every traffic light, spread over worker processes when there
+    are enough lights to make that worthwhile
+    
+    The point index is handed to each worker once, through the pool
+    initializer (inherited without copying where processes fork).
+    
+    Returns:
+        Analysis results in the order of light_coords
+    """
+    workers = min(os.cpu_count() or 1, len(light_coords) // LIGHTS_PER_WORKER)
+    if workers <= 1:
+        return [analyze_traffic_light(coords, points) for coords in light_coords]
+    
+    # One contiguous batch per worker keeps the results in order
+    batch_size = -(-len(light_coords) // workers)
+    batches = [light_coords[i:i + batch_size] for i in range(0, len(light_coords), batch_size)]
+    
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(points,)) as pool:
+        return [analysis for batch in pool.map(analyze_light_batch, batches)
+                for analysis in batch]
+
 def generate_analysis():
     """Main function to generate traffic light analysis"""
     print_header("TRAFFIC LIGHT STATIC ANALYSIS GENERATOR")
@@ -232,28 +406,28 @@ def generate_analysis():
         return False
     
     # Load processed trips
-    trips = load_processed_trips()
-    if not trips:
+    trip_count, points = load_trip_points()
+    if not trip_count:
         print_error("No processed trip data found!")
         return False
     
-    print_info(f"Analyzing {len(traffic_lights_data['features'])} traffic lights against {len(trips)} trips...")
+    print_info(f"Analyzing {len(traffic_lights_data['features'])} traffic lights against {trip_count} trips...")
     print_info("Using 25m radius, 5 km/h brake threshold, 2 km/h stop threshold")
     
     # Analyze each traffic light
     analyzed_features = []
     
-    for i, feature in enumerate(traffic_lights_data['features'], 1):
-        coords = feature['geometry']['coordinates']
-        properties = feature['properties'].copy()
-        
-        # Analyze this traffic light
-        analysis = analyze_traffic_light(coords, trips)
-        
-        # Add analysis results to properties (match app.js property names)
+    analyses = analyze_traffic_lights(
+        [feature['geometry']['coordinates'] for feature in traffic_lights_data['features']], points
+    )
+    
+    for feature, analysis in zip(traffic_lights_data['features'], analyses):
+        # Add analysis results to properties (match app.js property names);
+        # the loaded traffic lights aren't used afterwards, so no copy is needed
+        properties = feature['properties']
         properties.update(analysis)
         
-        # Create new feature with analysis
+        # Create new feature with analysis (only the keys app.js uses)
         analyzed_feature = {
             'type': 'Feature',
             'geometry': feature['geometry'],
@@ -261,9 +435,6 @@ def generate_analysis():
         }
         
         analyzed_features.append(analyzed_feature)
-        
-        if i % 10 == 0:
-            print_info(f"Analyzed {i}/{len(traffic_lights_data['features'])} traffic lights...")
     
     # Create output GeoJSON
     output_data = {
@@ -271,17 +442,27 @@ def generate_analysis():
         'features': analyzed_features
     }
     
-    # Save to file
+    # Save to file, compact: it is only read by the web app, not by people
     output_file = 'traffic_lights_analyzed.json'
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(output_data, f, indent=2, ensure_ascii=False)
+    write_json(output_file, output_data)
     
     print_success(f"Analysis complete! Saved to: {output_file}")
     
     # Print statistics
     print_header("ANALYSIS SUMMARY")
     
-    lights_with_data = sum(1 for f in analyzed_features if f['properties']['has_data'])
+    # One pass collects the lights with data and their score totals
+    lights_with_scores = []
+    total_safety = total_efficiency = total_overall = 0
+    for f in analyzed_features:
+        p = f['properties']
+        if p['has_data']:
+            lights_with_scores.append(f)
+            total_safety += p['safety_score']
+            total_efficiency += p['efficiency_score']
+            total_overall += p['overall_score']
+    
+    lights_with_data = len(lights_with_scores)
     lights_without_data = len(analyzed_features) - lights_with_data
     
     print(f"{Colors.BOLD}Traffic Lights:{Colors.END}")
@@ -291,10 +472,6 @@ def generate_analysis():
     
     if lights_with_data > 0:
         # Calculate average scores
-        total_safety = sum(f['properties']['safety_score'] for f in analyzed_features if f['properties']['has_data'])
-        total_efficiency = sum(f['properties']['efficiency_score'] for f in analyzed_features if f['properties']['has_data'])
-        total_overall = sum(f['properties']['overall_score'] for f in analyzed_features if f['properties']['has_data'])
-        
         avg_safety = total_safety / lights_with_data
         avg_efficiency = total_efficiency / lights_with_data
         avg_overall = total_overall / lights_with_data
@@ -304,11 +481,12 @@ def generate_analysis():
         print(f"  Efficiency: {avg_efficiency:.1f}/100")
         print(f"  Overall: {avg_overall:.1f}/100")
         
-        # Find worst performers
-        worst_safety = sorted([f for f in analyzed_features if f['properties']['has_data']], 
-                             key=lambda x: x['properties']['safety_score'], reverse=True)[:3]
-        worst_efficiency = sorted([f for f in analyzed_features if f['properties']['has_data']], 
-                                 key=lambda x: x['properties']['efficiency_score'], reverse=True)[:3]
+        # Find worst performers; nlargest keeps the top 3 without sorting every
+        # light and, like a stable sort, lists tied lights in their original order
+        worst_safety = heapq.nlargest(3, lights_with_scores,
+                                      key=lambda x: x['properties']['safety_score'])
+        worst_efficiency = heapq.nlargest(3, lights_with_scores,
+                                          key=lambda x: x['properties']['efficiency_score'])
         
         print(f"\n{Colors.BOLD}Top 3 Safety Concerns (Most Sudden Braking):{Colors.END}")
         for i, light in enumerate(worst_safety, 1):
@@ -331,14 +509,13 @@ def generate_analysis():
     return True
 
 def main():
-    """Main entry point"""
+    """Main entry point, returns the process exit status"""
     success = generate_analysis()
-    return success
+    return 0 if success else 1
 
 if __name__ == "__main__":
     try:
-        success = main()
-        exit(0 if success else 1)
+        exit(main())
     except KeyboardInterrupt:
         print(f"\n{Colors.YELLOW}Analysis cancelled by user{Colors.END}")
         exit(1)
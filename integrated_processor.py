@@ -1,9 +1,19 @@
-import json
+import io
 import math
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
 import numpy as np
 from pathlib import Path
 from datetime import datetime, timedelta
 from road_quality_calculator import calculate_road_quality
+from pipeline_core import VERBOSE, iter_features, read_json, write_json
+
+try:
+    import ijson  # Optional: streams trip features instead of loading whole files
+except ImportError:
+    ijson = None
 
 # Configuration
 DEFAULT_WHEEL_DIAMETER_MM = 711  # 26 inches - fallback only
@@ -24,10 +34,9 @@ def load_metadata():
     meta_file = Path("trips_metadata.json")
     if meta_file.exists():
         try:
-            with open(meta_file, 'r') as f:
-                metadata = json.load(f)
-                print(f"📖 Loaded metadata for {len(metadata)} trips (read-only)")
-                return metadata
+            metadata = read_json(meta_file)
+            print(f"📖 Loaded metadata for {len(metadata)} trips (read-only)")
+            return metadata
         except Exception as e:
             print(f"⚠️  Could not load metadata file: {e}")
     return {}
@@ -83,43 +92,38 @@ def haversine_distance(lon1, lat1, lon2, lat2):
     
     return R * c
 
-def extract_metadata_and_features(data):
-    """Separate metadata (features without coordinates) from actual features"""
-    features = []
-    metadata = {}
-    
-    # Important metadata keys to keep
-    important_keys = {
-        'WheelDiam', 'Wheel mm', 'Frequency', 'GNSS', 'SENSOR',
-        'Trip stop code', 'Trip start/end', 'Duration', 'Charge(start | stop)',
-        'Hardware', 'Firmware', 'SystemID', 'App version',
-        'BLE Device Information Service', 'Sensor\'s connection',
-        ',Duration,Stops,Dist km,AVG km/h,AVGWOS km/h,MAX km/h,MAX- m/s²,MAX+ m/s²,Falls,Bamps,Elevation m'
-    }
-    
-    for feat in data.get("features", []):
-        geom = feat.get("geometry", {})
-        coords = geom.get("coordinates", None)
-        
-        # Check if this is a metadata feature (no coordinates or empty coordinates)
-        if coords is None or (isinstance(coords, list) and len(coords) == 0):
-            # This is metadata - only keep important keys
-            props = feat.get("properties", {})
-            for key, value in props.items():
-                # Keep only important metadata keys (skip sensor data rows)
-                if key in important_keys or (not key.startswith(',,') and len(key) < 100):
-                    metadata[key] = value
-        else:
-            features.append(feat)
+# Important metadata keys to keep
+IMPORTANT_METADATA_KEYS = {
+    'WheelDiam', 'Wheel mm', 'Frequency', 'GNSS', 'SENSOR',
+    'Trip stop code', 'Trip start/end', 'Duration', 'Charge(start | stop)',
+    'Hardware', 'Firmware', 'SystemID', 'App version',
+    'BLE Device Information Service', 'Sensor\'s connection',
+    ',Duration,Stops,Dist km,AVG km/h,AVGWOS km/h,MAX km/h,MAX- m/s²,MAX+ m/s²,Falls,Bamps,Elevation m'
+}
+
+def is_metadata_key(key):
+    """Keep only important metadata keys (skip sensor data rows)"""
+    return key in IMPORTANT_METADATA_KEYS or (not key.startswith(',,') and len(key) < 100)
+
+def load_trip_features(filepath):
+    """
+    Open a trip GeoJSON file for a single pass over its features
     
-    # Also check if metadata is in the top-level properties
-    if not metadata and 'properties' in data:
-        top_props = data.get('properties', {})
-        for key, value in top_props.items():
-            if key in important_keys or (not key.startswith(',,') and len(key) < 100):
-                metadata[key] = value
+    Returns:
+        (features, top_properties): with ijson, features is a generator that
+        streams the file and top_properties is None (read on demand by
+        read_top_level_properties); otherwise the whole file is parsed
+    """
+    if ijson is None:
+        data = read_json(filepath)
+        return data.get('features', []), data.get('properties', {})
     
-    return features, metadata
+    return iter_features(filepath), None
+
+def read_top_level_properties(filepath):
+    """Read just the top-level properties of a GeoJSON file with ijson"""
+    with open(filepath, 'rb') as f:
+        return next(ijson.items(f, 'properties', use_float=True), None) or {}
 
 def get_wheel_diameter(trip_id, file_metadata, saved_metadata):
     """Get wheel diameter from file metadata or saved metadata, in mm"""
@@ -157,7 +161,8 @@ def get_wheel_diameter(trip_id, file_metadata, saved_metadata):
         wheel_value = file_metadata.get('WheelDiam') or file_metadata.get('Wheel mm')
         diameter = parse_wheel_diameter(wheel_value)
         if diameter:
-            print(f"    ✓ Using wheel diameter from file metadata: {diameter:.1f}mm")
+            if VERBOSE:
+                print(f"    ✓ Using wheel diameter from file metadata: {diameter:.1f}mm")
             return diameter
     
     # Second try: previously saved metadata for this trip
@@ -173,31 +178,99 @@ def get_wheel_diameter(trip_id, file_metadata, saved_metadata):
             
             diameter = parse_wheel_diameter(wheel_value)
             if diameter:
-                print(f"    ✓ Using wheel diameter from saved metadata: {diameter:.1f}mm")
+                if VERBOSE:
+                    print(f"    ✓ Using wheel diameter from saved metadata: {diameter:.1f}mm")
                 return diameter
     
     # Fallback to default
     print(f"    ⚠️  Wheel diameter not found, using default: {DEFAULT_WHEEL_DIAMETER_MM}mm")
     return DEFAULT_WHEEL_DIAMETER_MM
 
-def extract_acceleration_data(features):
-    """Extract Y-axis acceleration data from features"""
+def raw_acceleration(props):
+    """Unconverted Y-axis acceleration of one feature (0.0 if missing)"""
+    # Try different possible field names
+    acc_y = (props.get('Acc Y (g)') or 
+             props.get('Acc Y') or 
+             props.get('AccY') or 
+             props.get('acc_y'))
+    
+    return acc_y if acc_y is not None else 0.0
+
+def acceleration_array(values):
+    """Convert raw acceleration values to a float array"""
+    try:
+        # NumPy parses the whole column of numeric strings in one call
+        return np.array(values, dtype=np.float64)
+    except (ValueError, TypeError):
+        # Some value isn't a plain number: convert one by one, defaulting to 0.0
+        return np.array([safe_float(v, 0.0) for v in values], dtype=np.float64)
+
+def scan_trip_features(features):
+    """
+    Single pass over a trip's features that separates metadata (features
+    without coordinates) from actual features, and collects the Y-axis
+    acceleration of every actual feature plus its track point.
+    Features are not kept, so a streamed file is never fully in memory.
+    
+    Returns:
+        (points, acc_y_data, metadata, feature_count)
+    """
+    points = []
     acc_y_values = []
+    metadata = {}
+    idx = 0
     
-    for feature in features:
-        props = feature.get('properties', {})
-        # Try different possible field names
-        acc_y = (props.get('Acc Y (g)') or 
-                 props.get('Acc Y') or 
-                 props.get('AccY') or 
-                 props.get('acc_y'))
+    for feat in features:
+        geom = feat.get("geometry", {})
+        coords = geom.get("coordinates", None)
         
-        if acc_y is not None:
-            acc_y_values.append(safe_float(acc_y, 0.0))
-        else:
-            acc_y_values.append(0.0)
+        # Check if this is a metadata feature (no coordinates or empty coordinates)
+        if coords is None or (isinstance(coords, list) and len(coords) == 0):
+            # This is metadata - only keep important keys
+            props = feat.get("properties", {})
+            for key, value in props.items():
+                if is_metadata_key(key):
+                    metadata[key] = value
+            continue
+        
+        acc_y_values.append(raw_acceleration(feat.get('properties', {})))
+        
+        point = make_point(feat, idx)
+        if point is not None:
+            points.append(point)
+        idx += 1
     
-    return np.array(acc_y_values)
+    return points, acceleration_array(acc_y_values), metadata, idx
+
+def make_point(feature, idx):
+    """Track point at the end of a feature's line (None if it has no usable position)"""
+    coords = feature['geometry']['coordinates']
+    props = feature['properties']
+    
+    if len(coords) >= 2:
+        lon, lat = coords[-1]
+    else:
+        return None
+    
+    if not lon or not lat or lon == 0 or lat == 0:
+        return None
+    
+    samples_value = props.get('Samples', 0)
+    samples_int = safe_int(samples_value, 0)
+    
+    return {
+        'lon': float(lon),
+        'lat': float(lat),
+        'marker': safe_int(props.get('marker', 0)),
+        'samples': samples_int,
+        'samples_raw': samples_value,
+        'hrot': safe_int(props.get('HRot Count', 0)),
+        'time': parse_time(props.get('HH:mm:ss'), props.get('SSS')),
+        'time_str': props.get('HH:mm:ss'),
+        'time_ms': props.get('SSS'),
+        'original_speed': props.get('Speed'),
+        'idx': idx
+    }
 
 def map_road_quality_to_segments(points, road_quality_data):
     """
@@ -211,30 +284,40 @@ def map_road_quality_to_segments(points, road_quality_data):
     time_windows = road_quality_data['time_windows']
     
     # Create a lookup function
-    def get_quality_at_sample(sample_idx):
-        """Find the road quality score for a given sample index"""
+    def get_quality_at_samples(sample_indices):
+        """Find the road quality scores for an array of sample indices"""
+        sample_indices = np.asarray(sample_indices, dtype=np.int64)
         if len(time_windows) == 0:
-            return 0
+            return np.zeros(len(sample_indices), dtype=np.int8)
         
-        # Find the closest time window
-        closest_idx = np.argmin(np.abs(time_windows - sample_idx))
-        return int(quality_scores[closest_idx])
-    
-    return get_quality_at_sample
+        # Find the closest time window (the earlier one on a tie); window
+        # centers ascend, so binary search gives the neighbours on each side
+        pos = np.searchsorted(time_windows, sample_indices)
+        left = np.maximum(pos - 1, 0)
+        right = np.minimum(pos, len(time_windows) - 1)
+        take_left = (pos == len(time_windows)) | (
+            (pos > 0) & (sample_indices - time_windows[left] <= time_windows[right] - sample_indices))
+        return quality_scores[np.where(take_left, left, right)]
+    
+    return get_quality_at_samples
 
 def process_geojson_file(filepath, trip_id, saved_metadata, debug=False):
     """Process a single GeoJSON file: clean, calculate speeds, add road quality"""
     try:
-        with open(filepath, 'r') as f:
-            data = json.load(f)
+        features, top_properties = load_trip_features(filepath)
         
-        if 'features' not in data:
-            return None, None
+        # Step 1: Read points, acceleration and metadata in one pass
+        points, acc_y_data, file_metadata, feature_count = scan_trip_features(features)
         
-        # Step 1: Extract features and metadata
-        features, file_metadata = extract_metadata_and_features(data)
+        # Also check if metadata is in the top-level properties
+        if not file_metadata:
+            if top_properties is None:
+                top_properties = read_top_level_properties(filepath)
+            for key, value in top_properties.items():
+                if is_metadata_key(key):
+                    file_metadata[key] = value
         
-        if not features:
+        if feature_count == 0:
             return None, file_metadata
         
         # Get wheel diameter from file or saved metadata
@@ -242,8 +325,8 @@ def process_geojson_file(filepath, trip_id, saved_metadata, debug=False):
         wheel_circumference_m = (wheel_diameter_mm / 1000) * math.pi
         
         # Step 2: Extract acceleration data and calculate road quality
-        print(f"    🛣️  Calculating road quality...")
-        acc_y_data = extract_acceleration_data(features)
+        if VERBOSE:
+            print(f"    🛣️  Calculating road quality...")
         
         road_quality_data = None
         if len(acc_y_data) > 200:  # Need enough data for analysis
@@ -253,7 +336,8 @@ def process_geojson_file(filepath, trip_id, saved_metadata, debug=False):
                     window_size=100, 
                     overlap=0.5
                 )
-                print(f"    ✓ Road quality calculated for {len(road_quality_data['road_quality'])} windows")
+                if VERBOSE:
+                    print(f"    ✓ Road quality calculated for {len(road_quality_data['road_quality'])} windows")
             except Exception as e:
                 print(f"    ⚠️  Road quality calculation failed: {e}")
         else:
@@ -261,7 +345,7 @@ def process_geojson_file(filepath, trip_id, saved_metadata, debug=False):
         
         if debug:
             print(f"\n  DEBUG - Metadata extraction:")
-            print(f"    Found {len(features)} features")
+            print(f"    Found {feature_count} features")
             print(f"    Acceleration data points: {len(acc_y_data)}")
             print(f"    Metadata keys: {list(file_metadata.keys()) if file_metadata else 'None'}")
             
@@ -270,41 +354,13 @@ def process_geojson_file(filepath, trip_id, saved_metadata, debug=False):
             print(f"    Circumference: {wheel_circumference_m:.3f}m")
             
             if road_quality_data:
+                # Scores are 1-5, so one bincount gives both the set of scores and their counts
+                score_counts = np.bincount(road_quality_data['road_quality'], minlength=6)
                 print(f"\n  DEBUG - Road quality:")
-                print(f"    Unique scores: {np.unique(road_quality_data['road_quality'])}")
-                print(f"    Score distribution: {np.bincount(road_quality_data['road_quality'], minlength=6)[1:]}")
-        
-        # Step 3: Extract and sort points
-        points = []
-        for idx, feature in enumerate(features):
-            coords = feature['geometry']['coordinates']
-            props = feature['properties']
-            
-            if len(coords) >= 2:
-                lon, lat = coords[-1]
-            else:
-                continue
-            
-            if not lon or not lat or lon == 0 or lat == 0:
-                continue
-            
-            samples_value = props.get('Samples', 0)
-            samples_int = safe_int(samples_value, 0)
-            
-            points.append({
-                'lon': float(lon),
-                'lat': float(lat),
-                'marker': safe_int(props.get('marker', 0)),
-                'samples': samples_int,
-                'samples_raw': samples_value,
-                'hrot': safe_int(props.get('HRot Count', 0)),
-                'time': parse_time(props.get('HH:mm:ss'), props.get('SSS')),
-                'time_str': props.get('HH:mm:ss'),
-                'time_ms': props.get('SSS'),
-                'original_speed': props.get('Speed'),
-                'idx': idx
-            })
+                print(f"    Unique scores: {np.flatnonzero(score_counts)}")
+                print(f"    Score distribution: {score_counts[1:]}")
         
+        # Step 3: Sort points
         points.sort(key=lambda p: p['samples'])
         
         if len(points) < 2:
@@ -314,7 +370,8 @@ def process_geojson_file(filepath, trip_id, saved_metadata, debug=False):
         quality_lookup = map_road_quality_to_segments(points, road_quality_data)
         
         # Step 5: Calculate speeds and create line segments with road quality
-        new_features = []
+        segments = []
+        midpoint_samples = []
         
         i = 0
         while i < len(points) - 1:
@@ -367,48 +424,56 @@ def process_geojson_file(filepath, trip_id, saved_metadata, debug=False):
             if speed_kmh > 40:
                 speed_kmh = 40
             
-            # Get road quality for this segment (use midpoint sample index)
-            midpoint_sample = (start_point['samples'] + end_point['samples']) // 2
-            road_quality = quality_lookup(midpoint_sample) if quality_lookup else 0
-            
             # Only create segments with movement and reasonable speeds
             if (start_point['lon'] != end_point['lon'] or 
                 start_point['lat'] != end_point['lat']) and speed_kmh < 100:
-                
-                new_feature = {
-                    'type': 'Feature',
-                    'geometry': {
-                        'type': 'LineString',
-                        'coordinates': [
-                            [start_point['lon'], start_point['lat']],
-                            [end_point['lon'], end_point['lat']]
-                        ]
-                    },
-                    'properties': {
-                        'Speed': round(speed_kmh, 1),
-                        'road_quality': road_quality,
-                        'marker': start_point['marker'],
-                        'trip_id': trip_id,
-                        'hrot_diff': hrot_diff,
-                        'sample_diff': end_point['samples'] - start_point['samples'],
-                        'time_diff_s': round(time_diff_seconds, 3),
-                        'gps_distance_m': round(gps_distance, 1),
-                        'original_speed': start_point['original_speed'],
-                        'wheel_diameter_mm': wheel_diameter_mm
-                    }
-                }
-                new_features.append(new_feature)
+                segments.append((start_point, end_point, speed_kmh, hrot_diff,
+                                 time_diff_seconds, gps_distance))
+                # Road quality for this segment uses the midpoint sample index
+                midpoint_samples.append((start_point['samples'] + end_point['samples']) // 2)
             
             i = j
         
-        if not new_features:
+        if not segments:
             return None, file_metadata
         
-        # Print road quality stats for this trip
+        # Road quality for all segments at once, so each feature is built
+        # complete in a single pass below
         if quality_lookup:
-            qualities = [f['properties']['road_quality'] for f in new_features]
-            quality_counts = np.bincount(qualities, minlength=6)[1:]
-            print(f"    📊 Road quality distribution: {dict(enumerate(quality_counts, 1))}")
+            qualities = quality_lookup(midpoint_samples)
+            
+            # Print road quality stats for this trip
+            if VERBOSE:
+                quality_counts = np.bincount(qualities, minlength=6)[1:]
+                print(f"    📊 Road quality distribution: {dict(enumerate(quality_counts, 1))}")
+        else:
+            qualities = np.zeros(len(segments), dtype=np.int8)
+        
+        new_features = []
+        for segment, road_quality in zip(segments, qualities.tolist()):
+            start_point, end_point, speed_kmh, hrot_diff, time_diff_seconds, gps_distance = segment
+            new_features.append({
+                'type': 'Feature',
+                'geometry': {
+                    'type': 'LineString',
+                    'coordinates': [
+                        [start_point['lon'], start_point['lat']],
+                        [end_point['lon'], end_point['lat']]
+                    ]
+                },
+                'properties': {
+                    'Speed': round(speed_kmh, 1),
+                    'road_quality': road_quality,
+                    'marker': start_point['marker'],
+                    'trip_id': trip_id,
+                    'hrot_diff': hrot_diff,
+                    'sample_diff': end_point['samples'] - start_point['samples'],
+                    'time_diff_s': round(time_diff_seconds, 3),
+                    'gps_distance_m': round(gps_distance, 1),
+                    'original_speed': start_point['original_speed'],
+                    'wheel_diameter_mm': wheel_diameter_mm
+                }
+            })
         
         processed_data = {
             'type': 'FeatureCollection',
@@ -424,8 +489,37 @@ def process_geojson_file(filepath, trip_id, saved_metadata, debug=False):
             print(f"  Traceback: {traceback.format_exc()}")
         return None, None
 
+def process_trip(geojson_file, trip_id, output_file, debug, saved_metadata):
+    """
+    Process one trip file and save the result, in a worker process
+    
+    Returns:
+        (number of segments written or None on failure, captured console output,
+         the segments' (speed, road quality) pairs for the run statistics)
+    """
+    log = io.StringIO()
+    with redirect_stdout(log):
+        processed_data, metadata = process_geojson_file(
+            geojson_file, trip_id, saved_metadata, debug=debug
+        )
+    
+    if not processed_data:
+        return None, log.getvalue(), []
+    
+    # Save processed file in sensor subfolder
+    output_file.parent.mkdir(exist_ok=True)
+    write_json(output_file, processed_data)
+    
+    segment_stats = [(f['properties']['Speed'], f['properties']['road_quality'])
+                     for f in processed_data['features']]
+    return len(processed_data['features']), log.getvalue(), segment_stats
+
 def process_all_trips(input_dir=INPUT_ROOT, output_dir=OUTPUT_ROOT):
-    """Process all GeoJSON files in sensor data directory"""
+    """Process all GeoJSON files in sensor data directory
+    
+    Returns:
+        False if the input directory does not exist, True otherwise
+    """
     
     input_path = Path(input_dir)
     output_path = Path(output_dir)
@@ -433,7 +527,7 @@ def process_all_trips(input_dir=INPUT_ROOT, output_dir=OUTPUT_ROOT):
     
     if not input_path.exists():
         print(f"❌ Directory not found: {input_dir}")
-        return
+        return False
     
     # Load existing metadata (DO NOT overwrite - csv_to_geojson owns this file!)
     saved_metadata = load_metadata()
@@ -451,20 +545,19 @@ def process_all_trips(input_dir=INPUT_ROOT, output_dir=OUTPUT_ROOT):
     failed_files = 0
     total_segments = 0
     
-    # Process each sensor folder
+    # Find the trips to process first, so they can all be processed in
+    # parallel while the report below is printed in folder order
+    sensors = []
+    jobs = []
+    new_trip_stats = {}
+    
     for folder in sorted(input_path.iterdir()):
         if not folder.is_dir():
             continue
         
-        sensor_id = folder.name
-        print(f"Processing sensor {sensor_id}...")
-        
         # Find all _clean.geojson files
-        geojson_files = list(folder.glob("*_clean.geojson"))
-        
-        for idx, geojson_file in enumerate(geojson_files):
-            total_files += 1
-            
+        trips = []
+        for geojson_file in folder.glob("*_clean.geojson"):
             # Parse filename to get trip ID
             filename = geojson_file.stem  # e.g., "602B3_Trip1_clean"
             trip_id = filename.replace("_clean", "")  # e.g., "602B3_Trip1"
@@ -473,46 +566,56 @@ def process_all_trips(input_dir=INPUT_ROOT, output_dir=OUTPUT_ROOT):
             serial = trip_id.split("_")[0]
             trip = "_".join(trip_id.split("_")[1:])
             
-            if serial in SKIP_TRIPS and trip in SKIP_TRIPS[serial]:
-                print(f"  ⏩ Skipping {trip_id}")
-                skipped_files += 1
-                continue
-            
             # Check if already processed
-            sensor_output_dir = output_path / sensor_id
-            output_file = sensor_output_dir / f"{trip_id}_processed.geojson"
-            
-            if output_file.exists():
-                print(f"  ✓ {trip_id} already processed")
-                already_processed += 1
-                continue
+            output_file = output_path / folder.name / f"{trip_id}_processed.geojson"
             
-            print(f"  🔄 Processing {trip_id}...")
-            
-            # Enable debug for first file only
-            debug = (idx == 0 and processed_files == 0)
-            
-            # Process the file
-            processed_data, metadata = process_geojson_file(
-                geojson_file, trip_id, saved_metadata, debug=debug
-            )
+            if serial in SKIP_TRIPS and trip in SKIP_TRIPS[serial]:
+                status = 'skip'
+            elif output_file.exists():
+                status = 'done'
+            else:
+                status = 'process'
+                # Enable debug for the first trip processed, in verbose mode
+                jobs.append((geojson_file, trip_id, output_file, VERBOSE and not jobs and not trips))
+            trips.append((trip_id, status))
+        
+        sensors.append((folder.name, trips))
+    
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as pool:
+        futures = iter([pool.submit(process_trip, *job, saved_metadata) for job in jobs])
+        
+        # Process each sensor folder
+        for sensor_id, trips in sensors:
+            print(f"Processing sensor {sensor_id}...")
             
-            if processed_data:
-                # Save processed file in sensor subfolder
-                sensor_output_dir.mkdir(exist_ok=True)
+            for trip_id, status in trips:
+                total_files += 1
                 
-                with open(output_file, 'w') as f:
-                    json.dump(processed_data, f)
+                if status == 'skip':
+                    print(f"  ⏩ Skipping {trip_id}")
+                    skipped_files += 1
+                    continue
                 
-                num_segments = len(processed_data['features'])
-                total_segments += num_segments
-                processed_files += 1
-                print(f"  ✅ {num_segments} segments created")
-            else:
-                failed_files += 1
-                print(f"  ❌ Failed to process")
-        
-        print(f"  ✅ Sensor complete\n")
+                if status == 'done':
+                    print(f"  ✓ {trip_id} already processed")
+                    already_processed += 1
+                    continue
+                
+                print(f"  🔄 Processing {trip_id}...")
+                
+                num_segments, log, segment_stats = next(futures).result()
+                print(log, end='')
+                
+                if num_segments is not None:
+                    new_trip_stats[output_path / sensor_id / f"{trip_id}_processed.geojson"] = segment_stats
+                    total_segments += num_segments
+                    processed_files += 1
+                    print(f"  ✅ {num_segments} segments created")
+                else:
+                    failed_files += 1
+                    print(f"  ❌ Failed to process")
+            
+            print(f"  ✅ Sensor complete\n")
     
     
     # Don't save metadata - just preserve what exists from CSV converter
@@ -542,17 +645,19 @@ def process_all_trips(input_dir=INPUT_ROOT, output_dir=OUTPUT_ROOT):
             continue
         
         for processed_file in sensor_folder.glob("*_processed.geojson"):
+            # Trips processed in this run came back with their statistics,
+            # only files from earlier runs need to be read again
+            segment_stats = new_trip_stats.get(processed_file)
             try:
-                with open(processed_file, 'r') as f:
-                    data = json.load(f)
-                    for f in data['features']:
-                        speed = f['properties'].get('Speed', 0)
-                        quality = f['properties'].get('road_quality', 0)
-                        
-                        if speed > 0:
-                            all_speeds.append(speed)
-                        if quality > 0:
-                            all_qualities.append(quality)
+                if segment_stats is None:
+                    data = read_json(processed_file)
+                    segment_stats = [(f['properties'].get('Speed', 0), f['properties'].get('road_quality', 0))
+                                     for f in data['features']]
+                for speed, quality in segment_stats:
+                    if speed > 0:
+                        all_speeds.append(speed)
+                    if quality > 0:
+                        all_qualities.append(quality)
             except:
                 pass
     
@@ -570,18 +675,15 @@ def process_all_trips(input_dir=INPUT_ROOT, output_dir=OUTPUT_ROOT):
         for i, (label, count) in enumerate(zip(quality_labels, quality_counts), 1):
             percentage = (count / len(all_qualities)) * 100
             print(f"   {i} ({label}): {count} segments ({percentage:.1f}%)")
-
-if __name__ == "__main__":
-    import sys
     
-    if len(sys.argv) >= 2:
-        input_dir = sys.argv[1]
-    else:
-        input_dir = INPUT_ROOT
-    
-    if len(sys.argv) >= 3:
-        output_dir = sys.argv[2]
-    else:
-        output_dir = OUTPUT_ROOT
+    return True
+
+def main(argv=()):
+    """Main entry point: argv is [input_dir] [output_dir], returns the exit status"""
+    input_dir = argv[0] if len(argv) >= 1 else INPUT_ROOT
+    output_dir = argv[1] if len(argv) >= 2 else OUTPUT_ROOT
     
-    process_all_trips(input_dir, output_dir)
\ No newline at end of file
+    return 0 if process_all_trips(input_dir, output_dir) else 1
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
\ No newline at end of file
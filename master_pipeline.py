@@ -9,10 +9,15 @@ Runs the complete data processing workflow:
 5. PMTiles generation for web visualization
 6. Cleanup of processed CSV files
 
-Usage: python master_pipeline.py
+Steps 2-4 are skipped when none of their input or output files changed
+since they last ran. Steps 1 and 5 always run: csv_data/ only holds new
+CSVs, and build_pmtiles.py tracks its own inputs.
+
+Usage: python master_pipeline.py [--force]
+  --force    Re-run every step even if its outputs are up to date
 """
 
-import subprocess
+import importlib.util
 import sys
 import os
 import json
@@ -20,44 +25,23 @@ from pathlib import Path
 import time
 import shutil
 
-# ANSI color codes for pretty output
-class Colors:
-    HEADER = '\033[95m'
-    BLUE = '\033[94m'
-    CYAN = '\033[96m'
-    GREEN = '\033[92m'
-    YELLOW = '\033[93m'
-    RED = '\033[91m'
-    END = '\033[0m'
-    BOLD = '\033[1m'
-    UNDERLINE = '\033[4m'
-
-def print_header(text):
-    """Print a section header"""
-    print(f"\n{Colors.HEADER}{Colors.BOLD}{'=' * 70}{Colors.END}")
-    print(f"{Colors.HEADER}{Colors.BOLD}{text.center(70)}{Colors.END}")
-    print(f"{Colors.HEADER}{Colors.BOLD}{'=' * 70}{Colors.END}\n")
-
-def print_step(step_num, step_name):
-    """Print a step header"""
-    print(f"\n{Colors.CYAN}{Colors.BOLD}[STEP {step_num}] {step_name}{Colors.END}")
-    print(f"{Colors.CYAN}{'─' * 70}{Colors.END}")
-
-def print_success(text):
-    """Print success message"""
-    print(f"{Colors.GREEN}✅ {text}{Colors.END}")
+try:
+    import ijson  # Optional: lets the summary count features without loading whole files
+except ImportError:
+    ijson = None
 
-def print_error(text):
-    """Print error message"""
-    print(f"{Colors.RED}❌ {text}{Colors.END}")
+from pipeline_core import (
+    Colors, Step, count_files, print_error, print_header, print_info,
+    print_success, print_warning, print_step, run_pipeline
+)
 
-def print_warning(text):
-    """Print warning message"""
-    print(f"{Colors.YELLOW}⚠️  {text}{Colors.END}")
-
-def print_info(text):
-    """Print info message"""
-    print(f"{Colors.BLUE}ℹ️  {text}{Colors.END}")
+TRAFFIC_LIGHT_FILES = [
+    "traffic_lights.json",
+    "verkeerslichten.geojson",
+    "traffic_lights.geojson",
+    "data/verkeerslichten.geojson",
+    "data/traffic_lights.json"
+]
 
 def check_prerequisites():
     """Check if all required tools and files exist"""
@@ -94,15 +78,8 @@ def check_prerequisites():
             print_success(f"Found {script}")
     
     # Check for traffic lights file
-    traffic_light_files = [
-        "traffic_lights.json",
-        "verkeerslichten.geojson",
-        "traffic_lights.geojson",
-        "data/verkeerslichten.geojson",
-        "data/traffic_lights.json"
-    ]
     found_traffic_lights = False
-    for tl_file in traffic_light_files:
+    for tl_file in TRAFFIC_LIGHT_FILES:
         if Path(tl_file).exists():
             print_success(f"Found traffic lights file: {tl_file}")
             found_traffic_lights = True
@@ -113,59 +90,15 @@ def check_prerequisites():
         print_info("Traffic light analysis will be skipped")
     
     # Check if tippecanoe is installed
-    try:
-        result = subprocess.run(
-            ["tippecanoe", "--version"],
-            capture_output=True,
-            text=True,
-            check=False
-        )
-        if result.returncode == 0:
-            print_success("tippecanoe is installed")
-        else:
-            issues.append("tippecanoe not found")
-            print_error("tippecanoe not found")
-            print_info("Install with: brew install tippecanoe (macOS)")
-    except FileNotFoundError:
+    if shutil.which("tippecanoe"):
+        print_success("tippecanoe is installed")
+    else:
         issues.append("tippecanoe not found")
         print_error("tippecanoe not found")
         print_info("Install with: brew install tippecanoe (macOS)")
     
     return len(issues) == 0, issues
 
-def run_command(command, description):
-    """Run a shell command and handle errors"""
-    print_info(f"Running: {description}")
-    print(f"{Colors.BOLD}Command:{Colors.END} {' '.join(command)}\n")
-    
-    start_time = time.time()
-    
-    try:
-        result = subprocess.run(
-            command,
-            check=True,
-            capture_output=False,
-            text=True
-        )
-        
-        elapsed = time.time() - start_time
-        print_success(f"{description} completed in {elapsed:.2f}s")
-        return True
-        
-    except subprocess.CalledProcessError as e:
-        print_error(f"{description} failed!")
-        print_error(f"Exit code: {e.returncode}")
-        return False
-    except FileNotFoundError:
-        print_error(f"Command not found: {command[0]}")
-        return False
-
-def count_files(directory, pattern):
-    """Count files matching a pattern in a directory"""
-    if not Path(directory).exists():
-        return 0
-    return len(list(Path(directory).rglob(pattern)))
-
 def cleanup_csv_files():
     """Delete processed CSV files"""
     print_step("6", "Cleaning Up Processed CSV Files")
@@ -175,7 +108,9 @@ def cleanup_csv_files():
         print_warning("csv_data/ directory not found")
         return
     
-    csv_files = list(csv_dir.glob("*.csv"))
+    entries = list(os.scandir(csv_dir))
+    csv_files = [e for e in entries
+                 if e.is_file() and e.name.endswith(".csv") and not e.name.startswith(".")]
     
     if not csv_files:
         print_info("No CSV files to clean up")
@@ -198,15 +133,29 @@ def cleanup_csv_files():
         print_warning("CSV cleanup cancelled")
         return
     
+    # Common case: csv_data/ holds nothing but these CSVs, so remove and
+    # recreate the whole directory in one call instead of unlinking each file
+    if len(csv_files) == len(entries):
+        try:
+            shutil.rmtree(csv_dir)
+            csv_dir.mkdir()
+            print_success(f"Deleted {len(csv_files)} CSV file(s)")
+            return
+        except OSError as e:
+            csv_dir.mkdir(exist_ok=True)
+            print_warning(f"Could not clear {csv_dir}/ in one go ({e}), deleting files individually")
+    
     # Delete files
     deleted_count = 0
     failed_count = 0
     
     for csv_file in csv_files:
         try:
-            csv_file.unlink()
+            os.unlink(csv_file.path)
             deleted_count += 1
             print_success(f"Deleted {csv_file.name}")
+        except FileNotFoundError:
+            deleted_count += 1  # Already removed by the rmtree attempt
         except Exception as e:
             failed_count += 1
             print_error(f"Failed to delete {csv_file.name}: {e}")
@@ -217,6 +166,15 @@ def cleanup_csv_files():
     if failed_count > 0:
         print_warning(f"Failed to delete {failed_count} file(s)")
 
+def count_geojson_features(path):
+    """Count the features in a GeoJSON file, streaming it with ijson when available"""
+    if ijson is None:
+        with open(path) as f:
+            return len(json.load(f).get('features', []))
+    
+    with open(path, 'rb') as f:
+        return sum(1 for _ in ijson.items(f, 'features.item'))
+
 def print_summary():
     """Print a summary of generated files"""
     print_header("PIPELINE SUMMARY")
@@ -241,10 +199,8 @@ def print_summary():
     
     if road_segments_exists:
         try:
-            with open("road_segments_averaged.json") as f:
-                data = json.load(f)
-                segment_count = len(data.get('features', []))
-                print(f"     Segments: {segment_count}")
+            segment_count = count_geojson_features("road_segments_averaged.json")
+            print(f"     Segments: {segment_count}")
         except:
             pass
     
@@ -274,10 +230,10 @@ def check_python_packages():
     missing_packages = []
     
     for package in required_packages:
-        try:
-            __import__(package)
+        # find_spec locates the package without importing (and initializing) it
+        if importlib.util.find_spec(package) is not None:
             print_success(f"Package '{package}' is installed")
-        except ImportError:
+        else:
             missing_packages.append(package)
             print_error(f"Package '{package}' is NOT installed")
     
@@ -289,7 +245,7 @@ def check_python_packages():
     
     return True
 
-def main():
+def main(force=False):
     """Main pipeline execution"""
     print_header("REFLECTOR RIDE MAPS - MASTER PIPELINE")
     print(f"{Colors.BOLD}This will process all CSV files and regenerate map data{Colors.END}\n")
@@ -327,80 +283,41 @@ def main():
     
     total_start = time.time()
     
-    # Step 1: CSV to GeoJSON
-    print_step("1", "Converting CSV to GeoJSON")
-    step1_success = run_command(
-        [sys.executable, "csv_to_geojson_converter.py"],
-        "CSV to GeoJSON conversion"
-    )
-    
-    if not step1_success:
-        print_error("Step 1 failed. Aborting pipeline.")
-        sys.exit(1)
+    has_traffic_lights = any(Path(f).exists() for f in TRAFFIC_LIGHT_FILES)
+    
+    clean_files = ("sensor_data/**/*_clean.geojson",)
+    processed_files = ("processed_sensor_data/**/*_processed.geojson",)
+    
+    steps = [
+        Step("1", "Converting CSV to GeoJSON",
+             "csv_to_geojson_converter.py", "CSV to GeoJSON conversion"),
+        Step("2", "Calculating Speeds from Sensor Data",
+             "integrated_processor.py", "Speed calculation",
+             inputs=clean_files, outputs=processed_files),
+        # Steps 3 and 4 both only read step 2's output, so they run in parallel
+        Step("3", "Averaging and Consolidating Road Segments",
+             "road_averaging.py", "Road segment averaging",
+             required=False, parallel=True,
+             inputs=processed_files, outputs=("road_segments_averaged.json",)),
+        Step("4", "Generating Traffic Light Analysis",
+             "generate_traffic_light_analysis.py", "Traffic light analysis",
+             required=False, parallel=True,
+             skip_reason="" if has_traffic_lights else
+             "No traffic lights file found - skipping traffic light analysis",
+             inputs=processed_files + tuple(TRAFFIC_LIGHT_FILES),
+             outputs=("traffic_lights_analyzed.json",)),
+        Step("5", "Building PMTiles for Web",
+             "build_pmtiles.py", "PMTiles generation"),
+    ]
     
-    # Step 2: Calculate speeds
-    print_step("2", "Calculating Speeds from Sensor Data")
-    step2_success = run_command(
-        [sys.executable, "integrated_processor.py"],
-        "Speed calculation"
-    )
+    if force:
+        print_info("--force given, re-running every step")
     
-    if not step2_success:
-        print_error("Step 2 failed. Aborting pipeline.")
+    if not run_pipeline(steps, force=force):
         sys.exit(1)
     
-    # Step 3: Average road segments
-    print_step("3", "Averaging and Consolidating Road Segments")
-    step3_success = run_command(
-        [sys.executable, "road_averaging.py"],
-        "Road segment averaging"
-    )
-    
-    if not step3_success:
-        print_warning("Step 3 failed, but continuing with pipeline...")
-    
-    # Step 4: Generate traffic light analysis
-    print_step("4", "Generating Traffic Light Analysis")
-    
-    # Check if traffic lights file exists
-    traffic_light_files = [
-        "traffic_lights.json",
-        "verkeerslichten.geojson",
-        "traffic_lights.geojson",
-        "data/verkeerslichten.geojson",
-        "data/traffic_lights.json"
-    ]
-    has_traffic_lights = any(Path(f).exists() for f in traffic_light_files)
-    
-    if has_traffic_lights:
-        step4_success = run_command(
-            [sys.executable, "generate_traffic_light_analysis.py"],
-            "Traffic light analysis"
-        )
-        
-        if not step4_success:
-            print_warning("Step 4 failed, but continuing with pipeline...")
-    else:
-        print_warning("No traffic lights file found - skipping traffic light analysis")
-        print_info("Add traffic_lights.json or verkeerslichten.geojson to enable this feature")
-        step4_success = True  # Don't fail pipeline if optional step is skipped
-    
-    # Step 5: Build PMTiles
-    print_step("5", "Building PMTiles for Web")
-    step5_success = run_command(
-        [sys.executable, "build_pmtiles.py"],
-        "PMTiles generation"
-    )
-    
-    if not step5_success:
-        print_error("Step 5 failed. Aborting pipeline.")
-        sys.exit(1)
-    
-    # Step 6: Cleanup CSV files (only if all previous steps succeeded)
-    if step1_success and step2_success and step5_success:
-        cleanup_csv_files()
-    else:
-        print_warning("Skipping CSV cleanup due to pipeline errors")
+    # Step 6: Cleanup CSV files (only reached if all required steps succeeded)
+    cleanup_csv_files()
     
     # Print summary
     total_elapsed = time.time() - total_start
@@ -409,7 +326,7 @@ def main():
 
 if __name__ == "__main__":
     try:
-        main()
+        main(force='--force' in sys.argv[1:])
     except KeyboardInterrupt:
         print(f"\n\n{Colors.YELLOW}Pipeline interrupted by user{Colors.END}")
         sys.exit(1)
@@ -0,0 +1,289 @@
+"""
+Pipeline Core for Reflector Ride Maps
+Shared console output and JSON file helpers and the step runner used by
+master_pipeline.py and the individual processing scripts
+"""
+
+import importlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import groupby
+from pathlib import Path
+
+try:
+    import ijson  # Optional: streams GeoJSON features instead of loading whole files
+except ImportError:
+    ijson = None
+
+try:
+    import orjson  # Optional: much faster JSON parsing and writing
+except ImportError:
+    orjson = None
+
+# Per-file progress messages are only printed with REFLECTOR_VERBOSE=1
+VERBOSE = os.environ.get('REFLECTOR_VERBOSE', '0') == '1'
+
+# Input and output files of each step's last successful run
+STATE_FILE = Path(".pipeline_state.json")
+
+# ANSI color codes for pretty output
+class Colors:
+    HEADER = '\033[95m'
+    BLUE = '\033[94m'
+    CYAN = '\033[96m'
+    GREEN = '\033[92m'
+    YELLOW = '\033[93m'
+    RED = '\033[91m'
+    END = '\033[0m'
+    BOLD = '\033[1m'
+    UNDERLINE = '\033[4m'
+
+# Redirected to a file or CI log: no escape codes or banner rulers
+_FANCY = sys.stdout.isatty()
+
+if not _FANCY:
+    for attr in dir(Colors):
+        if not attr.startswith('_'):
+            setattr(Colors, attr, '')
+
+def print_header(text):
+    """Print a section header"""
+    if not _FANCY:
+        print(f"\n{text}\n")
+        return
+    print(f"\n{Colors.HEADER}{Colors.BOLD}{'=' * 70}{Colors.END}")
+    print(f"{Colors.HEADER}{Colors.BOLD}{text.center(70)}{Colors.END}")
+    print(f"{Colors.HEADER}{Colors.BOLD}{'=' * 70}{Colors.END}\n")
+
+def print_step(step_num, step_name):
+    """Print a step header and flush everything buffered so far"""
+    print(f"\n{Colors.CYAN}{Colors.BOLD}[STEP {step_num}] {step_name}{Colors.END}")
+    print(f"{Colors.CYAN}{'─' * 70}{Colors.END}")
+    # Messages are left to stdout's buffer (block-buffered when piped to a
+    # log) and written out at step boundaries, so a step's output stays in
+    # order with anything its child processes write
+    sys.stdout.flush()
+
+def print_success(text):
+    """Print success message"""
+    print(f"{Colors.GREEN}✅ {text}{Colors.END}")
+
+def print_error(text):
+    """Print error message"""
+    print(f"{Colors.RED}❌ {text}{Colors.END}")
+
+def print_warning(text):
+    """Print warning message"""
+    print(f"{Colors.YELLOW}⚠️  {text}{Colors.END}")
+
+def print_info(text):
+    """Print info message"""
+    print(f"{Colors.BLUE}ℹ️  {text}{Colors.END}")
+
+def read_json(path):
+    """Parse a JSON file, with orjson when available"""
+    if orjson is None:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    with open(path, 'rb') as f:
+        raw = f.read()
+    try:
+        return orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        # Only the json module accepts NaN/Infinity, which Python writes for NaN floats
+        return json.loads(raw)
+
+def iter_features(path):
+    """
+    Yield the features of a GeoJSON file, streaming them with ijson when
+    available, otherwise parsing the whole file with read_json
+    """
+    if ijson is None:
+        yield from read_json(path).get('features', [])
+        return
+
+    # ijson picks its fastest installed backend (the yajl2 C extension if present)
+    with open(path, 'rb') as f:
+        yield from ijson.items(f, 'features.item', use_float=True)
+
+def write_json(path, data, indent=False):
+    """Write data as JSON (indented by 2 spaces if indent is set), with orjson when available"""
+    if orjson is None:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2 if indent else None, ensure_ascii=False)
+        return
+    
+    option = orjson.OPT_SERIALIZE_NUMPY
+    if indent:
+        option |= orjson.OPT_INDENT_2
+    with open(path, 'wb') as f:
+        f.write(orjson.dumps(data, option=option))
+
+def run_step(step):
+    """
+    Run a step in this process by importing its script and calling main().
+
+    main() follows sys.exit() conventions: None or 0 means success. The
+    step sees a bare sys.argv, as if its script was run without arguments,
+    so the pipeline's own flags (like --force) never reach it.
+    """
+    print_info(f"Running: {step.description}")
+    print(f"{Colors.BOLD}Module:{Colors.END} {Path(step.script).stem}.main()\n")
+
+    start_time = time.time()
+
+    saved_argv = sys.argv
+    sys.argv = [step.script]
+    try:
+        module = importlib.import_module(Path(step.script).stem)
+        status = module.main()
+    except SystemExit as e:
+        status = e.code
+    except Exception as e:
+        print_error(f"{step.description} failed!")
+        print_error(f"{type(e).__name__}: {e}")
+        sys.stdout.flush()
+        return False
+    finally:
+        sys.argv = saved_argv
+
+    if status not in (None, 0):
+        print_error(f"{step.description} failed!")
+        print_error(f"Exit code: {status}")
+        sys.stdout.flush()
+        return False
+
+    elapsed = time.time() - start_time
+    print_success(f"{step.description} completed in {elapsed:.2f}s")
+    sys.stdout.flush()
+    return True
+
+def count_files(directory, pattern):
+    """Count files matching a pattern in a directory"""
+    path = Path(directory)
+    if not path.exists():
+        return 0
+    return sum(1 for _ in path.rglob(pattern))
+
+def file_set(patterns):
+    """{path: [size, mtime_ns]} of the files matching glob patterns"""
+    files = {}
+    for pattern in patterns:
+        for p in Path().glob(pattern):
+            if p.is_file():
+                st = p.stat()
+                files[str(p)] = [st.st_size, st.st_mtime_ns]
+    return files
+
+def load_state():
+    """Load the file sets recorded by earlier pipeline runs"""
+    try:
+        with open(STATE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_state(state):
+    """Save the recorded file sets"""
+    try:
+        with open(STATE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2)
+    except OSError as e:
+        print_warning(f"Could not save pipeline state: {e}")
+
+@dataclass
+class Step:
+    """One pipeline stage, backed by one of the processing scripts' main()"""
+    num: str
+    name: str
+    script: str
+    description: str
+    required: bool = True    # Abort the pipeline if this step fails
+    skip_reason: str = ""    # Set to skip the step with this warning
+    parallel: bool = False   # May run alongside adjacent parallel steps
+    inputs: tuple = ()       # Glob patterns the step reads
+    outputs: tuple = ()      # Glob patterns the step writes
+
+    def snapshot(self):
+        """The step's current input and output files, for comparing with a later run"""
+        return {'inputs': file_set(self.inputs), 'outputs': file_set(self.outputs)}
+
+    def up_to_date(self, state):
+        """
+        True if the step's outputs exist and no input or output file was
+        added, removed or changed since the step last succeeded (as recorded
+        in state)
+
+        Comparing mtimes alone would miss inputs copied in with their old
+        timestamps and removed files.
+        """
+        if not self.outputs:
+            return False
+        snapshot = self.snapshot()
+        return bool(snapshot['outputs']) and state.get(self.num) == snapshot
+
+def run_pipeline(steps, force=False):
+    """
+    Run pipeline steps in order.
+
+    Consecutive steps marked parallel=True only depend on earlier steps, not
+    on each other, so they run side by side in worker processes and the
+    pipeline waits for all of them before moving on. A failing optional
+    step only prints a warning; a failing required step aborts the run.
+    Steps whose input and output files haven't changed since their last
+    successful run are skipped unless force is set. Steps without declared
+    outputs always run.
+
+    Returns:
+        True if every required step succeeded
+    """
+    state = load_state()
+
+    for parallel, group in groupby(steps, key=lambda step: step.parallel):
+        group = list(group)
+
+        if parallel and len(group) > 1:
+            runnable = []
+            for step in group:
+                print_step(step.num, step.name)
+                if step.skip_reason:
+                    print_warning(step.skip_reason)
+                elif not force and step.up_to_date(state):
+                    print_info("Outputs are up to date, skipping")
+                else:
+                    runnable.append(step)
+
+            sys.stdout.flush()  # Don't let workers inherit unflushed output
+            with ProcessPoolExecutor(max_workers=max(1, len(runnable))) as pool:
+                results = list(zip(runnable, pool.map(run_step, runnable)))
+        else:
+            results = []
+            for step in group:
+                print_step(step.num, step.name)
+                if step.skip_reason:
+                    print_warning(step.skip_reason)
+                    continue
+                if not force and step.up_to_date(state):
+                    print_info("Outputs are up to date, skipping")
+                    continue
+                results.append((step, run_step(step)))
+
+        for step, success in results:
+            if success:
+                if step.outputs:
+                    state[step.num] = step.snapshot()
+                    save_state(state)
+                continue
+            if state.pop(step.num, None) is not None:
+                save_state(state)  # Whatever it left behind isn't a finished run
+            if step.required:
+                print_error(f"Step {step.num} failed. Aborting pipeline.")
+                return False
+            print_warning(f"Step {step.num} failed, but continuing with pipeline...")
+
+    return True
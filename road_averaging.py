@@ -1,9 +1,26 @@
-import json
-import glob
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 import math
+import os
+import sys
 from pathlib import Path
 
+import numpy as np
+
+from pipeline_core import iter_features, write_json
+
+try:
+    import numba  # Optional: compiles the distance and bearing math
+except ImportError:
+    numba = None
+
+def jit(func):
+    """Compile a scalar math helper with numba when it is installed"""
+    if numba is None:
+        return func
+    return numba.njit(cache=True, inline='always')(func)
+
+@jit
 def haversine_distance(lon1, lat1, lon2, lat2):
     """Calculate distance between two points in meters"""
     R = 6371000
@@ -17,211 +34,410 @@ def haversine_distance(lon1, lat1, lon2, lat2):
     
     return R * c
 
-def calculate_bearing(lon1, lat1, lon2, lat2):
-    """Calculate bearing between two points in degrees"""
-    dlon = math.radians(lon2 - lon1)
-    lat1 = math.radians(lat1)
-    lat2 = math.radians(lat2)
-    
-    y = math.sin(dlon) * math.cos(lat2)
-    x = math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * math.cos(lat2) * math.cos(dlon)
-    bearing = math.degrees(math.atan2(y, x))
-    return (bearing + 360) % 360
+def haversine_vector(lon1, lat1, lon2, lat2):
+    """Calculate distances in meters between arrays of points, element-wise"""
+    R = 6371000
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    dphi = np.radians(lat2 - lat1)
+    dlambda = np.radians(lon2 - lon1)
+    
+    a = np.sin(dphi/2)**2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda/2)**2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1-a))
+    
+    return R * c
 
-def snap_to_grid(lon, lat, grid_size=0.001):
-    """Snap coordinates to a coarser grid (0.001 = ~111m)"""
-    return (round(lon / grid_size) * grid_size, 
-            round(lat / grid_size) * grid_size)
+if numba is not None:
+    @numba.njit(cache=True, parallel=True)
+    def segment_lengths(starts, ends):
+        """Length in meters of each segment, given (N, 2) lon/lat arrays of start and end points"""
+        lengths = np.empty(len(starts))
+        for i in numba.prange(len(starts)):
+            lengths[i] = haversine_distance(starts[i, 0], starts[i, 1], ends[i, 0], ends[i, 1])
+        return lengths
+else:
+    def segment_lengths(starts, ends):
+        """Length in meters of each segment, given (N, 2) lon/lat arrays of start and end points"""
+        return haversine_vector(starts[:, 0], starts[:, 1], ends[:, 0], ends[:, 1])
 
-def are_segments_similar(coord1a, coord1b, coord2a, coord2b, distance_threshold=50, bearing_threshold=15):
-    """Check if two segments are similar enough to be merged"""
-    # Calculate midpoints
-    mid1_lon = (coord1a[0] + coord1b[0]) / 2
-    mid1_lat = (coord1a[1] + coord1b[1]) / 2
-    mid2_lon = (coord2a[0] + coord2b[0]) / 2
-    mid2_lat = (coord2a[1] + coord2b[1]) / 2
-    
-    # Check if midpoints are close
-    midpoint_dist = haversine_distance(mid1_lon, mid1_lat, mid2_lon, mid2_lat)
-    if midpoint_dist > distance_threshold:
-        return False
-    
-    # Check if bearings are similar
-    bearing1 = calculate_bearing(coord1a[0], coord1a[1], coord1b[0], coord1b[1])
-    bearing2 = calculate_bearing(coord2a[0], coord2a[1], coord2b[0], coord2b[1])
-    
-    bearing_diff = abs(bearing1 - bearing2)
-    if bearing_diff > 180:
-        bearing_diff = 360 - bearing_diff
-    
-    return bearing_diff < bearing_threshold
+def prepare_points(points):
+    """
+    Longitude and latitude in radians, plus sin and cos of the latitude, for
+    (N, 2) lon/lat points, computed once per point instead of once per
+    distance or bearing calculation
+    """
+    lon = np.radians(points[:, 0])
+    lat = np.radians(points[:, 1])
+    return lon, lat, np.sin(lat), np.cos(lat)
 
-def merge_segments(segments_list):
-    """Merge similar segments into consolidated ones"""
-    if not segments_list:
-        return []
+def bearing_vector(start, end):
+    """Calculate bearings in degrees between prepared start and end points, element-wise"""
+    lon1, _, sin_lat1, cos_lat1 = start
+    lon2, _, sin_lat2, cos_lat2 = end
+    dlon = lon2 - lon1
+    
+    y = np.sin(dlon) * cos_lat2
+    x = cos_lat1 * sin_lat2 - sin_lat1 * cos_lat2 * np.cos(dlon)
+    bearing = np.degrees(np.arctan2(y, x))
+    return (bearing + 360) % 360
+
+def build_segment_grid(mids, bearings, distance_threshold, bearing_threshold):
+    """
+    Bucket segments by midpoint into grid cells at least distance_threshold
+    meters wide, and by bearing into bins at least bearing_threshold degrees
+    wide. Any two segments within both thresholds are then in the same or
+    adjacent cells and in the same or adjacent (circularly) bearing bins.
+    
+    Returns:
+        (keys, grid, n_bins): each segment's (x, y, bin) key, a dict of
+        key -> sorted array of segment indices, and the number of bearing bins
+    """
+    # A degree of longitude shrinks with latitude, so size lon cells for the
+    # most poleward midpoint
+    cell_lat = distance_threshold / 111000
+    cell_lon = cell_lat / max(math.cos(math.radians(np.abs(mids[:, 1]).max(initial=0))), 1e-6)
+    cells = np.floor(mids / (cell_lon, cell_lat)).astype(np.int64)
+    
+    # Equal bins that divide the circle, each no narrower than the threshold
+    n_bins = max(int(360 // bearing_threshold), 1)
+    bins = np.floor(bearings / (360 / n_bins)).astype(np.int64) % n_bins
+    
+    keys = np.column_stack([cells, bins]).tolist()
+    grid = defaultdict(list)
+    for idx, key in enumerate(keys):
+        grid[tuple(key)].append(idx)  # Indices stay in ascending order per key
+    
+    return keys, {key: np.array(indices) for key, indices in grid.items()}, n_bins
+
+def cluster_segments(starts, ends, distance_threshold=50, bearing_threshold=15):
+    """
+    Group similar segments: each segment not yet in a group starts a new one
+    and takes in every later, ungrouped segment similar to it: midpoints
+    at most distance_threshold meters apart and bearings less than
+    bearing_threshold degrees apart
+    
+    Returns:
+        Group label per segment, numbered in order of each group's first segment
+    """
+    R = 6371000
+    labels = np.empty(len(starts), dtype=np.int64)
+    used = np.zeros(len(starts), dtype=np.bool_)
     
-    merged = []
-    used = set()
+    # Midpoint trig and segment bearings are computed once per segment here,
+    # not once per compared pair; plain floats are much cheaper than NumPy
+    # scalars in the per-pair math below
+    mids = (starts + ends) / 2
+    mid_lon, mid_lat, _, mid_cos = (values.tolist() for values in prepare_points(mids))
+    bearings = bearing_vector(prepare_points(starts), prepare_points(ends))
     
-    for i, seg1 in enumerate(segments_list):
-        if i in used:
+    # Only segments in neighbouring grid cells and bearing bins can be similar
+    keys, grid, n_bins = build_segment_grid(mids, bearings, distance_threshold, bearing_threshold)
+    neighbourhoods = {}  # key -> sorted indices of segments in it and the keys around it
+    no_segments = np.empty(0, dtype=np.int64)
+    bearings = bearings.tolist()
+    
+    # Squared angular distance (radians) with a 1% margin for the flat-earth
+    # approximation, which is far more accurate than that at these distances
+    prefilter_limit = (1.01 * distance_threshold / R)**2
+    
+    group = 0
+    for i in range(len(starts)):
+        if used[i]:
             continue
-            
-        # Start a merged group with this segment
-        group = [seg1]
-        used.add(i)
         
-        # Find all similar segments
-        for j, seg2 in enumerate(segments_list):
-            if j in used or j <= i:
-                continue
-                
-            if are_segments_similar(
-                seg1['coords'][0], seg1['coords'][1],
-                seg2['coords'][0], seg2['coords'][1]
-            ):
-                group.append(seg2)
-                used.add(j)
+        # Start a new group with this segment
+        labels[i] = group
+        used[i] = True
+        
+        # Find all similar segments among the nearby candidates, in list order
+        cx, cy, bin_ = keys[i]
+        nearby = neighbourhoods.get((cx, cy, bin_))
+        if nearby is None:
+            nearby = np.sort(np.concatenate([
+                grid.get((cx + dx, cy + dy, b), no_segments)
+                for dx in (-1, 0, 1)
+                for dy in (-1, 0, 1)
+                for b in {(bin_ - 1) % n_bins, bin_, (bin_ + 1) % n_bins}
+            ]))
+            neighbourhoods[cx, cy, bin_] = nearby
         
-        # Merge the group
-        all_speeds = []
-        all_qualities = []
-        all_trips = set()
+        # Later segments that are not in a group yet, as one vectorized mask
+        candidates = nearby[np.searchsorted(nearby, i, side='right'):]
+        candidates = candidates[~used[candidates]]
+        
+        lon1, lat1, cos1, bearing1 = mid_lon[i], mid_lat[i], mid_cos[i], bearings[i]
+        
+        for j in candidates.tolist():
+            # Cheap flat-earth distance first; it only rejects pairs well
+            # beyond the threshold, the exact check follows
+            dlat = mid_lat[j] - lat1
+            dlon = (mid_lon[j] - lon1) * cos1
+            if dlat * dlat + dlon * dlon > prefilter_limit:
+                continue
+            
+            # Check if midpoints are close (haversine)
+            a = (math.sin((mid_lat[j] - lat1) / 2)**2 +
+                 cos1 * mid_cos[j] * math.sin((mid_lon[j] - lon1) / 2)**2)
+            if 2 * R * math.atan2(math.sqrt(a), math.sqrt(1 - a)) > distance_threshold:
+                continue
+            
+            # Check if bearings are similar
+            bearing_diff = abs(bearing1 - bearings[j])
+            if bearing_diff > 180:
+                bearing_diff = 360 - bearing_diff
+            
+            if bearing_diff < bearing_threshold:
+                labels[j] = group
+                used[j] = True
         
-        for seg in group:
-            all_speeds.extend(seg['speeds'])
-            all_qualities.extend(seg['qualities'])
-            all_trips.update(seg['trips'])
+        group += 1
+    
+    return labels
+
+def merge_segments(segments, distance_threshold=50):
+    """
+    Merge similar segments into consolidated ones
+    
+    Args:
+        segments: dict of per-segment columns ('starts', 'ends', 'speeds',
+            'qualities' with 0 for unrated, 'trip_ids')
+    
+    Returns:
+        dict of columns per merged segment ('starts', 'ends', 'counts',
+        'speed_sums', 'speed_mins', 'speed_maxs', 'quality_sums',
+        'quality_counts', 'trip_counts', 'trip_bounds'), plus 'trip_ids'
+        holding each merged segment's distinct trip ids in the slice
+        starting at its 'trip_bounds' entry
+    """
+    labels = cluster_segments(segments['starts'], segments['ends'], distance_threshold)
+    
+    # bincount adds values in segment order, the same order (and so the same
+    # floating point result) as summing each group's list one by one
+    counts = np.bincount(labels)
+    rated = segments['qualities'] > 0
+    
+    def group_sums(values):
+        return np.bincount(labels, weights=values, minlength=len(counts))
+    
+    # Sorting by group makes each group's speeds a contiguous run starting
+    # at its bounds entry, so min/max reduce over all groups at once
+    speeds = segments['speeds'][np.argsort(labels, kind='stable')]
+    bounds = np.cumsum(counts) - counts
+    
+    # Distinct trips of every group in one pass: unique (group, trip) pairs
+    # come out sorted by group, then by trip id
+    n_trips = int(segments['trip_ids'].max(initial=0)) + 1
+    pairs = np.unique(labels * n_trips + segments['trip_ids'])
+    trip_counts = np.bincount(pairs // n_trips, minlength=len(counts))
+    
+    return {
+        # Average coordinates of each group
+        'starts': np.column_stack([group_sums(col) for col in segments['starts'].T]) / counts[:, None],
+        'ends': np.column_stack([group_sums(col) for col in segments['ends'].T]) / counts[:, None],
+        'counts': counts,
+        'speed_sums': group_sums(segments['speeds']),
+        'quality_sums': group_sums(segments['qualities']),
+        'speed_mins': np.minimum.reduceat(speeds, bounds),
+        'speed_maxs': np.maximum.reduceat(speeds, bounds),
+        'quality_counts': np.bincount(labels, weights=rated, minlength=len(counts)),
+        'trip_counts': trip_counts,
+        'trip_bounds': np.cumsum(trip_counts) - trip_counts,
+        'trip_ids': (pairs % n_trips).astype(np.int32)
+    }
+
+def load_trip_segments(file_path):
+    """
+    Read one trip file and return its line segments of 5 m or longer
+    
+    Returns:
+        (starts, ends, speeds, qualities) column arrays, with quality 0 for
+        unrated segments, or None if the file has no line segments
+    """
+    # Gather every line segment in the file so their lengths can be
+    # computed in a single vectorized call
+    starts = []
+    ends = []
+    speeds = []
+    qualities = []
+    
+    for feature in iter_features(file_path):
+        if feature['geometry']['type'] != 'LineString':
+            continue
+            
+        coords = feature['geometry']['coordinates']
+        props = feature['properties']
         
-        # Use average coordinates
-        avg_lon1 = sum(s['coords'][0][0] for s in group) / len(group)
-        avg_lat1 = sum(s['coords'][0][1] for s in group) / len(group)
-        avg_lon2 = sum(s['coords'][1][0] for s in group) / len(group)
-        avg_lat2 = sum(s['coords'][1][1] for s in group) / len(group)
+        speed = props.get('Speed', props.get('speed', 0))
+        quality = props.get('road_quality', 0)
         
-        merged.append({
-            'coords': ([avg_lon1, avg_lat1], [avg_lon2, avg_lat2]),
-            'speeds': all_speeds,
-            'qualities': all_qualities,
-            'trips': all_trips
-        })
-    
-    return merged
+        for coord1, coord2 in zip(coords, coords[1:]):
+            starts.append(coord1)
+            ends.append(coord2)
+            speeds.append(speed)
+            qualities.append(quality)
+    
+    if not starts:
+        return None
+    
+    a = np.asarray(starts, dtype=float)[:, :2]
+    b = np.asarray(ends, dtype=float)[:, :2]
+    speeds = np.asarray(speeds, dtype=float)
+    qualities = np.asarray(qualities, dtype=float)
+    qualities = np.where(qualities > 0, qualities, 0).astype(np.int8)
+    
+    # Skip very short segments (less than 5 meters)
+    keep = segment_lengths(a, b) >= 5
+    
+    return a[keep], b[keep], speeds[keep], qualities[keep]
 
-def process_trip_files(input_pattern="processed_sensor_data/**/*_processed.geojson"):
+def find_trip_files(root, suffix="_processed.geojson"):
+    """
+    Recursively yield paths of files under root ending in suffix, in the
+    same order as a recursive glob and likewise skipping hidden entries
+    """
+    if not os.path.isdir(root):
+        return
+    
+    subdirs = []
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.name.startswith('.'):
+                continue
+            if entry.is_dir():
+                subdirs.append(entry.path)
+            elif entry.name.endswith(suffix):
+                yield entry.path
+    
+    for subdir in subdirs:
+        yield from find_trip_files(subdir, suffix)
+
+def process_trip_files(input_dir="processed_sensor_data"):
     """Process all trip files and aggregate road segment data"""
     
-    # Collect all segments first
-    all_segments = []
+    # Collect all segments first, as one column array per file
+    all_starts = []
+    all_ends = []
+    all_speeds = []
+    all_qualities = []
+    all_trip_ids = []
+    
+    # Trip names are stored once; segments refer to them by index
+    trip_names = []
     
-    files = glob.glob(input_pattern, recursive=True)
+    files = list(find_trip_files(input_dir))
     print(f"Found {len(files)} trip files to process")
     
     if len(files) == 0:
-        print("\n❌ No files found! Trying alternatives...")
-        alternatives = [
-            "**/*_processed.geojson",
-            "*/*_processed.geojson",
-            "*/processed_sensor_data/**/*_processed.geojson"
-        ]
-        
-        for alt in alternatives:
-            files = glob.glob(alt, recursive=True)
-            if files:
-                print(f"✅ Found {len(files)} files with pattern: {alt}")
-                break
+        # The current directory tree includes every other layout that used to
+        # be tried (*/*_processed.geojson, */processed_sensor_data/**/...)
+        print("\n❌ No files found! Searching the current directory...")
+        files = list(find_trip_files("."))
         
         if not files:
             print("\n❌ No files found.")
             return None
+        
+        print(f"✅ Found {len(files)} files under the current directory")
     
-    for file_path in files:
-        trip_id = Path(file_path).stem
-        print(f"Processing {trip_id}...")
+    # Files are parsed in worker processes; results are collected in file order
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as pool:
+        futures = [pool.submit(load_trip_segments, file_path) for file_path in files]
         
-        try:
-            with open(file_path, 'r') as f:
-                data = json.load(f)
+        for file_path, future in zip(files, futures):
+            trip_id = Path(file_path).stem
+            print(f"Processing {trip_id}...")
             
-            features = data.get('features', [])
+            try:
+                trip_segments = future.result()
+            except Exception as e:
+                print(f"Error processing {file_path}: {e}")
+                continue
+            
+            if trip_segments is None:
+                continue
             
-            for feature in features:
-                if feature['geometry']['type'] != 'LineString':
-                    continue
-                    
-                coords = feature['geometry']['coordinates']
-                props = feature['properties']
-                
-                speed = props.get('Speed', props.get('speed', 0))
-                quality = props.get('road_quality', 0)
-                
-                # Process each line segment
-                for i in range(len(coords) - 1):
-                    coord1 = coords[i]
-                    coord2 = coords[i + 1]
-                    
-                    # Skip very short segments
-                    dist = haversine_distance(coord1[0], coord1[1], coord2[0], coord2[1])
-                    if dist < 5:  # Less than 5 meters
-                        continue
-                    
-                    all_segments.append({
-                        'coords': (coord1, coord2),
-                        'speeds': [float(speed)],
-                        'qualities': [int(quality)] if quality > 0 else [],
-                        'trips': {trip_id}
-                    })
-                    
-        except Exception as e:
-            print(f"Error processing {file_path}: {e}")
-    
-    print(f"\nCollected {len(all_segments)} raw segments")
+            starts, ends, speeds, qualities = trip_segments
+            all_starts.append(starts)
+            all_ends.append(ends)
+            all_speeds.append(speeds)
+            all_qualities.append(qualities)
+            all_trip_ids.append(np.full(len(speeds), len(trip_names), dtype=np.int32))
+            trip_names.append(trip_id)
+    
+    segments = {
+        'starts': np.concatenate(all_starts) if all_starts else np.empty((0, 2)),
+        'ends': np.concatenate(all_ends) if all_ends else np.empty((0, 2)),
+        'speeds': np.concatenate(all_speeds) if all_speeds else np.empty(0),
+        'qualities': np.concatenate(all_qualities) if all_qualities else np.empty(0, dtype=np.int8),
+        'trip_ids': np.concatenate(all_trip_ids) if all_trip_ids else np.empty(0, dtype=np.int32)
+    }
+    
+    print(f"\nCollected {len(segments['speeds'])} raw segments")
     print("Merging similar segments...")
     
     # Merge similar segments
-    merged_segments = merge_segments(all_segments)
+    merged = merge_segments(segments)
+    
+    print(f"Consolidated to {len(merged['counts'])} segments")
     
-    print(f"Consolidated to {len(merged_segments)} segments")
+    # Averages and composite scores for every merged segment at once
+    counts = merged['counts']
+    quality_counts = merged['quality_counts']
+    
+    avg_speeds = merged['speed_sums'] / counts
+    avg_qualities = np.divide(merged['quality_sums'], quality_counts,
+                              out=np.zeros(len(counts)), where=quality_counts > 0)
+    
+    speed_scores = np.clip(100 - avg_speeds * 4, 0, None)
+    quality_scores = np.where(avg_qualities > 0, (avg_qualities - 1) * 25, 50)
+    composite_scores = quality_scores * 0.6 + speed_scores * 0.4
+    speed_ranges = merged['speed_maxs'] - merged['speed_mins']
+    distances = segment_lengths(merged['starts'], merged['ends'])
+    
+    # Round whole columns once, then hand plain Python lists to the loop below
+    avg_speeds = np.round(avg_speeds, 2).tolist()
+    min_speeds = np.round(merged['speed_mins'], 2).tolist()
+    max_speeds = np.round(merged['speed_maxs'], 2).tolist()
+    speed_ranges = np.round(speed_ranges, 2).tolist()
+    avg_qualities = np.round(avg_qualities, 2).tolist()
+    composite_scores = np.round(composite_scores, 2).tolist()
+    distances = np.round(distances, 2).tolist()
+    starts = merged['starts'].tolist()
+    ends = merged['ends'].tolist()
+    trip_ids = merged['trip_ids'].tolist()
+    trip_bounds = merged['trip_bounds'].tolist()
+    trip_counts = merged['trip_counts'].tolist()
     
     # Create output features
     features = []
     
-    for seg_data in merged_segments:
-        if len(seg_data['speeds']) < 2:
+    for g, count in enumerate(counts.tolist()):
+        if count < 2:
             continue
         
-        avg_speed = sum(seg_data['speeds']) / len(seg_data['speeds'])
-        min_speed = min(seg_data['speeds'])
-        max_speed = max(seg_data['speeds'])
-        
-        avg_quality = sum(seg_data['qualities']) / len(seg_data['qualities']) if seg_data['qualities'] else 0
-        
-        coord1, coord2 = seg_data['coords']
-        distance = haversine_distance(coord1[0], coord1[1], coord2[0], coord2[1])
+        avg_quality = avg_qualities[g]
         
-        # Composite score
-        speed_score = max(0, 100 - (avg_speed * 4))
-        quality_score = (avg_quality - 1) * 25 if avg_quality > 0 else 50
-        composite_score = (quality_score * 0.6) + (speed_score * 0.4)
+        # Trip ids become names only here, when writing the output
+        first_trip = trip_bounds[g]
+        trips = [trip_names[t] for t in trip_ids[first_trip:first_trip + trip_counts[g]]]
         
         feature = {
             'type': 'Feature',
             'geometry': {
                 'type': 'LineString',
-                'coordinates': [coord1, coord2]
+                'coordinates': [starts[g], ends[g]]
             },
             'properties': {
-                'avg_speed': round(avg_speed, 2),
-                'min_speed': round(min_speed, 2),
-                'max_speed': round(max_speed, 2),
-                'speed_variance': round(max_speed - min_speed, 2),
-                'avg_quality': round(avg_quality, 2) if avg_quality > 0 else None,
-                'observation_count': len(seg_data['speeds']),
-                'trip_count': len(seg_data['trips']),
-                'distance_m': round(distance, 2),
-                'composite_score': round(composite_score, 2),
-                'trips': list(seg_data['trips'])
+                'avg_speed': avg_speeds[g],
+                'min_speed': min_speeds[g],
+                'max_speed': max_speeds[g],
+                'speed_variance': speed_ranges[g],
+                'avg_quality': avg_quality if avg_quality > 0 else None,
+                'observation_count': count,
+                'trip_count': len(trips),
+                'distance_m': distances[g],
+                'composite_score': composite_scores[g],
+                'trips': trips
             }
         }
         
@@ -239,8 +455,7 @@ def process_trip_files(input_pattern="processed_sensor_data/**/*_processed.geojs
     }
     
     output_file = 'road_segments_averaged.json'
-    with open(output_file, 'w') as f:
-        json.dump(output, f)
+    write_json(output_file, output)
     
     print(f"\n✅ Saved to {output_file}")
     
@@ -258,10 +473,16 @@ def process_trip_files(input_pattern="processed_sensor_data/**/*_processed.geojs
     
     return output
 
-if __name__ == "__main__":
+def main():
+    """Main entry point"""
     result = process_trip_files()
     
     if result:
         print("\n🎉 Processing complete!")
-    else:
-        print("\n❌ Processing failed.")
\ No newline at end of file
+        return 0
+    
+    print("\n❌ Processing failed.")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -10,10 +10,46 @@ Separate module for calculating road quality based on acceleration data.
 
 import numpy as np
 
+from numpy.lib.stride_tricks import sliding_window_view
+
 from typing import Dict, List
 
 
 
+# Upper bounds of combined scores for road quality 1-4 (anything above is 5)
+
+QUALITY_THRESHOLDS = [0.05, 0.30, 0.55, 0.75]
+
+
+
+
+
+def _high_freq_weights(n: int) -> np.ndarray:
+
+    """
+
+    Weights over rfft bins whose dot product with an rfft power spectrum
+
+    equals the power in bins n//4..n-1 of the full FFT (its upper 3/4).
+
+    
+
+    Full bin k >= n//4 is rfft bin k itself when k <= n//2 and otherwise
+
+    the mirrored bin n-k, which covers rfft bins 1..(n-1)//2 once more.
+
+    """
+
+    weights = np.zeros(n // 2 + 1, dtype=np.float32)
+
+    weights[n // 4:] += 1
+
+    weights[1:(n - 1) // 2 + 1] += 1
+
+    return weights
+
+
+
 
 
 class RoadQualityCalculator:
@@ -54,147 +90,163 @@ class RoadQualityCalculator:
 
         """
 
+        # Sensor readings carry far less than float32 precision; computing in
+
+        # float32 halves the memory traffic of every batched operation below
+
+        acc_y_data = np.ascontiguousarray(acc_y_data, dtype=np.float32)
+
         n_samples = len(acc_y_data)
 
         step_size = int(window_size * (1 - overlap))
 
         
 
-        road_quality_scores = []
+        # Window start offsets (the last full window is excluded, as before)
+
+        starts = np.arange(0, max(n_samples - window_size, 0), step_size)
 
-        time_windows = []
+        time_windows = starts + window_size // 2  # Center of window
 
         
 
-        for i in range(0, n_samples - window_size, step_size):
+        if len(starts) == 0:
 
-            window_data = acc_y_data[i:i + window_size]
+            return {
 
-            time_windows.append(i + window_size // 2)  # Center of window
+                'road_quality': np.array([], dtype=np.int8),
 
-            
+                'time_windows': time_windows,
 
-            # Method 1: RMS (Root Mean Square) - better indicator of overall vibration
+                'window_size': window_size
 
-            rms_score = np.sqrt(np.mean(window_data**2))
+            }
 
-            
+        
 
-            # Method 2: Smoothness Index (inverse of roughness)
+        # All windows stacked as rows of one (n_windows, window_size) array,
 
-            smoothness_score = 1.0 / (1.0 + np.std(window_data))
+        # so every metric below is a single batched reduction along axis 1
 
-            
+        windows = sliding_window_view(acc_y_data, window_size)[starts]
 
-            # Method 3: Peak-to-Peak analysis (detect sudden impacts)
+        
 
-            peak_to_peak = np.max(window_data) - np.min(window_data)
+        # Method 1: RMS (Root Mean Square) - better indicator of overall vibration
 
-            
+        rms_score = np.sqrt(np.mean(windows**2, axis=1))
 
-            # Method 4: Frequency content analysis (using FFT)
+        
 
-            fft_data = np.fft.fft(window_data)
+        # Method 2: Smoothness Index (inverse of roughness)
 
-            power_spectrum = np.abs(fft_data)**2
+        smoothness_score = 1.0 / (1.0 + np.std(windows, axis=1))
 
-            high_freq_power = np.sum(power_spectrum[len(power_spectrum)//4:])
+        
 
-            freq_score = high_freq_power / len(window_data)
+        # Method 3: Peak-to-Peak analysis (detect sudden impacts)
 
-            
+        peak_to_peak = np.max(windows, axis=1) - np.min(windows, axis=1)
 
-            # Method 5: Jerk analysis (rate of change) - comfort indicator
+        
 
-            jerk = np.diff(window_data)
+        # Method 4: Frequency content analysis (using FFT)
 
-            jerk_rms = np.sqrt(np.mean(jerk**2))
+        # The signal is real, so rfft returns only the n//2+1 non-negative
 
-            
+        # frequency bins; the negative ones are their mirror images
 
-            # Weighted combination
+        fft_data = np.fft.rfft(windows, axis=1)
 
-            weights = {
+        power_spectrum = fft_data.real**2 + fft_data.imag**2
 
-                'rms': 0.35,
+        high_freq_power = power_spectrum @ _high_freq_weights(window_size)
 
-                'smoothness': 0.25,
+        freq_score = high_freq_power / window_size
 
-                'peak_to_peak': 0.20,
+        
 
-                'frequency': 0.10,
+        # Method 5: Jerk analysis (rate of change) - comfort indicator
 
-                'jerk': 0.10
+        jerk = np.diff(windows, axis=1)
 
-            }
+        jerk_rms = np.sqrt(np.mean(jerk**2, axis=1))
 
-            
+        
 
-            # Calculate individual normalized scores
+        # Weighted combination
 
-            normalized_rms = min(rms_score / 4.0, 1.0)
+        weights = {
 
-            normalized_smoothness = 1.0 - smoothness_score
+            'rms': 0.35,
 
-            normalized_peak_to_peak = min(peak_to_peak / 15.0, 1.0)
+            'smoothness': 0.25,
 
-            normalized_freq = min(freq_score / 15000.0, 1.0)
+            'peak_to_peak': 0.20,
 
-            normalized_jerk = min(jerk_rms / 4.0, 1.0)
+            'frequency': 0.10,
 
-            
+            'jerk': 0.10
 
-            combined_score = (
+        }
 
-                weights['rms'] * normalized_rms +
+        
 
-                weights['smoothness'] * normalized_smoothness +
+        # Calculate individual normalized scores
 
-                weights['peak_to_peak'] * normalized_peak_to_peak +
+        normalized_rms = np.minimum(rms_score / 4.0, 1.0)
 
-                weights['frequency'] * normalized_freq +
+        normalized_smoothness = 1.0 - smoothness_score
 
-                weights['jerk'] * normalized_jerk
+        normalized_peak_to_peak = np.minimum(peak_to_peak / 15.0, 1.0)
 
-            )
+        normalized_freq = np.minimum(freq_score / 15000.0, 1.0)
 
-            
+        normalized_jerk = np.minimum(jerk_rms / 4.0, 1.0)
 
-            # Convert to 1-5 scale using adjusted percentile-based thresholds
+        
 
-            # Balanced threshold for score 3 - middle ground between too high and too low
+        combined_score = (
 
-            if combined_score < 0.05:
+            weights['rms'] * normalized_rms +
 
-                road_quality = 1  # Top 5% - Perfect race track
+            weights['smoothness'] * normalized_smoothness +
 
-            elif combined_score < 0.30:
+            weights['peak_to_peak'] * normalized_peak_to_peak +
 
-                road_quality = 2  # 5-30% - Normal conditions
+            weights['frequency'] * normalized_freq +
 
-            elif combined_score < 0.55:
+            weights['jerk'] * normalized_jerk
 
-                road_quality = 3  # 30-55% - Worse conditions (balanced threshold)
+        )
 
-            elif combined_score < 0.75:
+        
 
-                road_quality = 4  # 55-75% - Bad conditions
+        # Convert to 1-5 scale using adjusted percentile-based thresholds
 
-            else:
+        # Balanced threshold for score 3 - middle ground between too high and too low
 
-                road_quality = 5  # Top 25% worst - Off-road/extreme
+        # < 0.05 -> 1: Top 5% - Perfect race track
 
-            
+        # < 0.30 -> 2: 5-30% - Normal conditions
 
-            road_quality_scores.append(road_quality)
+        # < 0.55 -> 3: 30-55% - Worse conditions (balanced threshold)
+
+        # < 0.75 -> 4: 55-75% - Bad conditions
+
+        # else   -> 5: Top 25% worst - Off-road/extreme
+
+        # Scores 1-5 fit in int8, which keeps later lookups and counts compact
+
+        road_quality = (np.digitize(combined_score, QUALITY_THRESHOLDS) + 1).astype(np.int8)
 
         
 
         return {
 
-            'road_quality': np.array(road_quality_scores),
+            'road_quality': road_quality,
 
-            'time_windows': np.array(time_windows),
+            'time_windows': time_windows,
 
             'window_size': window_size
 
@@ -206,17 +258,15 @@ class RoadQualityCalculator:
 
         """Detect peaks in acceleration data."""
 
-        peaks = []
-
-        for i in range(1, len(data) - 1):
+        data = np.asarray(data)
 
-            if (data[i] > data[i-1] and data[i] > data[i+1] and 
+        middle = data[1:-1]
 
-                abs(data[i]) > threshold):
+        # Strict local maxima above the threshold, checked for all samples at once
 
-                peaks.append(i)
+        is_peak = (middle > data[:-2]) & (middle > data[2:]) & (np.abs(middle) > threshold)
 
-        return peaks
+        return (np.flatnonzero(is_peak) + 1).tolist()
 
 
 
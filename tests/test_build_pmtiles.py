@@ -0,0 +1,199 @@
+"""
+Tests for the incremental PMTiles build in build_pmtiles.py, using stub
+tippecanoe and tile-join commands that record features per layer as JSON
+"""
+
+import contextlib
+import io
+import json
+import os
+import stat
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import build_pmtiles
+
+# Reads NDJSON features from stdin and writes {layer: feature count, ...}
+STUB_TIPPECANOE = '''
+import collections, json, sys
+args = sys.argv[1:]
+output = args[args.index('--output') + 1]
+with open('calls.log', 'a') as log:
+    log.write('tippecanoe\\n')
+layers = collections.Counter()
+for line in sys.stdin:
+    layers[json.loads(line)['tippecanoe']['layer']] += 1
+with open(output, 'w') as f:
+    json.dump(layers, f)
+'''
+
+# Adds up the layer counts of its input files
+STUB_TILE_JOIN = '''
+import collections, json, sys
+args = sys.argv[1:]
+output = args[args.index('--output') + 1]
+with open('calls.log', 'a') as log:
+    log.write('tile-join\\n')
+layers = collections.Counter()
+for path in args[args.index('--no-tile-size-limit') + 1:]:
+    with open(path) as f:
+        layers.update(json.load(f))
+with open(output, 'w') as f:
+    json.dump(layers, f)
+'''
+
+
+def write_trip(path, n_features):
+    """Write a processed trip GeoJSON with n_features line features"""
+    features = [{
+        'type': 'Feature',
+        'geometry': {'type': 'LineString', 'coordinates': [[4.9, 52.3], [4.9001, 52.3]]},
+        'properties': {'Speed': 15.0, 'road_quality': 2}
+    } for _ in range(n_features)]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({'type': 'FeatureCollection', 'features': features}))
+
+
+class BuildPmtilesTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.tmp_path = Path(self.tmp.name)
+
+        old_cwd = os.getcwd()
+        os.chdir(self.tmp_path)
+        self.addCleanup(os.chdir, old_cwd)
+
+        bin_dir = self.tmp_path / 'bin'
+        bin_dir.mkdir()
+        for name, source in (('tippecanoe', STUB_TIPPECANOE), ('tile-join', STUB_TILE_JOIN)):
+            script = bin_dir / name
+            script.write_text(f"#!{sys.executable}\n{source}")
+            script.chmod(script.stat().st_mode | stat.S_IXUSR)
+        old_path = os.environ['PATH']
+        os.environ['PATH'] = f"{bin_dir}{os.pathsep}{old_path}"
+        self.addCleanup(os.environ.__setitem__, 'PATH', old_path)
+
+        self.trips = self.tmp_path / 'processed_sensor_data'
+        write_trip(self.trips / 'A' / 'A_Trip1_processed.geojson', 3)
+        write_trip(self.trips / 'B' / 'B_Trip1_processed.geojson', 4)
+
+    def build(self, full_rebuild=False):
+        """Run build_pmtiles.main() quietly, returning its exit status"""
+        with contextlib.redirect_stdout(io.StringIO()), \
+                contextlib.redirect_stderr(io.StringIO()):
+            return build_pmtiles.main(full_rebuild=full_rebuild)
+
+    def tiles(self):
+        return json.loads(Path('trips.pmtiles').read_text())
+
+    def calls(self):
+        """Stub commands run since the last call"""
+        log = Path('calls.log')
+        if not log.exists():
+            return []
+        calls = log.read_text().split()
+        log.unlink()
+        return calls
+
+    def test_first_build_tiles_every_trip(self):
+        self.assertEqual(self.build(), 0)
+        self.assertEqual(self.tiles(), {'A_Trip1_processed': 3, 'B_Trip1_processed': 4})
+        self.assertEqual(self.calls(), ['tippecanoe'])
+        self.assertTrue(build_pmtiles.MANIFEST_FILE.exists())
+
+    def test_unchanged_trips_are_not_retiled(self):
+        self.build()
+        self.calls()
+        self.assertEqual(self.build(), 0)
+        self.assertEqual(self.calls(), [])
+
+    def test_touched_trip_is_not_retiled(self):
+        self.build()
+        self.calls()
+        os.utime(self.trips / 'A' / 'A_Trip1_processed.geojson')
+        self.assertEqual(self.build(), 0)
+        self.assertEqual(self.calls(), [])
+
+    def test_new_trip_is_merged_with_tile_join(self):
+        self.build()
+        self.calls()
+        write_trip(self.trips / 'C' / 'C_Trip1_processed.geojson', 5)
+        self.assertEqual(self.build(), 0)
+        self.assertEqual(self.calls(), ['tippecanoe', 'tile-join'])
+        self.assertEqual(self.tiles(), {'A_Trip1_processed': 3, 'B_Trip1_processed': 4,
+                                        'C_Trip1_processed': 5})
+
+        # The merged trip is in the manifest, so the next run has nothing to do
+        self.assertEqual(self.build(), 0)
+        self.assertEqual(self.calls(), [])
+
+    def test_changed_trip_forces_full_rebuild(self):
+        self.build()
+        self.calls()
+        write_trip(self.trips / 'A' / 'A_Trip1_processed.geojson', 6)
+        self.assertEqual(self.build(), 0)
+        self.assertEqual(self.calls(), ['tippecanoe'])
+        self.assertEqual(self.tiles(), {'A_Trip1_processed': 6, 'B_Trip1_processed': 4})
+
+    def test_removed_trip_forces_full_rebuild(self):
+        self.build()
+        self.calls()
+        (self.trips / 'B' / 'B_Trip1_processed.geojson').unlink()
+        self.assertEqual(self.build(), 0)
+        self.assertEqual(self.calls(), ['tippecanoe'])
+        self.assertEqual(self.tiles(), {'A_Trip1_processed': 3})
+
+    def test_changed_options_force_full_rebuild(self):
+        self.build()
+        self.calls()
+        manifest = json.loads(build_pmtiles.MANIFEST_FILE.read_text())
+        manifest['options'] = ['--maximum-zoom=14']
+        build_pmtiles.MANIFEST_FILE.write_text(json.dumps(manifest))
+        self.assertEqual(self.build(), 0)
+        self.assertEqual(self.calls(), ['tippecanoe'])
+
+    def test_digest_only_manifest_is_still_accepted(self):
+        self.build()
+        self.calls()
+        manifest = json.loads(build_pmtiles.MANIFEST_FILE.read_text())
+        manifest['files'] = {path: record['sha256'] for path, record in manifest['files'].items()}
+        build_pmtiles.MANIFEST_FILE.write_text(json.dumps(manifest))
+        self.assertEqual(self.build(), 0)
+        self.assertEqual(self.calls(), [])
+
+    def test_failed_rebuild_is_not_taken_as_current(self):
+        self.build()
+        corrupt = self.trips / 'C' / 'C_Trip1_processed.geojson'
+        corrupt.parent.mkdir()
+        corrupt.write_text('{"features": [')
+
+        with self.assertRaises(ValueError):
+            self.build(full_rebuild=True)
+        self.assertFalse(Path('trips.pmtiles').exists())
+        self.assertFalse(build_pmtiles.MANIFEST_FILE.exists())
+        self.calls()
+
+        # With the corrupt trip gone, the next run must rebuild everything
+        corrupt.unlink()
+        self.assertEqual(self.build(), 0)
+        self.assertEqual(self.calls(), ['tippecanoe'])
+        self.assertEqual(self.tiles(), {'A_Trip1_processed': 3, 'B_Trip1_processed': 4})
+
+    def test_failed_append_keeps_existing_tiles(self):
+        self.build()
+        corrupt = self.trips / 'C' / 'C_Trip1_processed.geojson'
+        corrupt.parent.mkdir()
+        corrupt.write_text('{"features": [')
+
+        with self.assertRaises(ValueError):
+            self.build()
+        self.assertEqual(self.tiles(), {'A_Trip1_processed': 3, 'B_Trip1_processed': 4})
+
+
+if __name__ == '__main__':
+    unittest.main()
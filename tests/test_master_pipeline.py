@@ -0,0 +1,148 @@
+"""
+Tests for running pipeline steps in-process through pipeline_core
+"""
+
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pipeline_core import Step, run_pipeline
+
+
+def write_clean_trip(path, n_features=300):
+    """Write a synthetic *_clean.geojson trip like csv_to_geojson_converter produces"""
+    features = []
+    for i in range(n_features):
+        lon = 4.9 + i * 1e-4
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'LineString',
+                         'coordinates': [[lon, 52.3], [lon + 1e-4, 52.3]]},
+            'properties': {
+                'HH:mm:ss': f"10:{i // 300:02d}:{(i // 5) % 60:02d}",
+                'SSS': str((i % 5) * 200),
+                'marker': str(i),
+                'HRot Count': str(i),
+                'Samples': str(i * 10),
+                'Speed': '150',
+                'Acc Y (g)': f"{0.8 + (i % 7) * 0.05:.3f}",
+                'trip_id': 'TEST1_Trip1'
+            }
+        })
+    path.parent.mkdir(parents=True)
+    path.write_text(json.dumps({'type': 'FeatureCollection', 'features': features}))
+
+
+class RunPipelineTest(unittest.TestCase):
+    def setUp(self):
+        # Steps read and write relative to the working directory
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.tmp_path = Path(self.tmp.name)
+        old_cwd = os.getcwd()
+        os.chdir(self.tmp_path)
+        self.addCleanup(os.chdir, old_cwd)
+        old_argv = sys.argv
+        self.addCleanup(setattr, sys, 'argv', old_argv)
+
+    def test_force_flag_does_not_reach_steps(self):
+        """`master_pipeline.py --force` must still let step 2 process its default input"""
+        write_clean_trip(self.tmp_path / 'sensor_data' / 'TEST1' / 'TEST1_Trip1_clean.geojson')
+        sys.argv = ['master_pipeline.py', '--force']
+
+        step = Step("2", "Calculating Speeds from Sensor Data",
+                    "integrated_processor.py", "Speed calculation",
+                    inputs=("sensor_data/**/*_clean.geojson",),
+                    outputs=("processed_sensor_data/**/*_processed.geojson",))
+
+        self.assertTrue(run_pipeline([step], force=True))
+        self.assertTrue((self.tmp_path / 'processed_sensor_data' / 'TEST1'
+                         / 'TEST1_Trip1_processed.geojson').exists())
+        self.assertEqual(sys.argv, ['master_pipeline.py', '--force'])
+
+    def test_missing_step_input_fails(self):
+        """A step whose input directory is missing must fail the pipeline"""
+        step = Step("2", "Calculating Speeds from Sensor Data",
+                    "integrated_processor.py", "Speed calculation")
+
+        self.assertFalse(run_pipeline([step], force=True))
+
+
+# A step script that copies its inputs' names into out.txt and logs each run
+COPY_STEP = '''
+from pathlib import Path
+
+def main():
+    with open('runs.log', 'a') as log:
+        log.write('run\\n')
+    Path('out.txt').write_text('\\n'.join(sorted(p.name for p in Path('in').glob('*.txt'))))
+'''
+
+
+class StalenessTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.tmp_path = Path(self.tmp.name)
+        old_cwd = os.getcwd()
+        os.chdir(self.tmp_path)
+        self.addCleanup(os.chdir, old_cwd)
+
+        (self.tmp_path / 'copy_step.py').write_text(COPY_STEP)
+        sys.path.insert(0, str(self.tmp_path))
+        self.addCleanup(sys.path.remove, str(self.tmp_path))
+        self.addCleanup(sys.modules.pop, 'copy_step', None)
+
+        (self.tmp_path / 'in').mkdir()
+        (self.tmp_path / 'in' / 'a.txt').write_text('a')
+        self.step = Step("2", "Copy", "copy_step.py", "Copy step",
+                         inputs=("in/*.txt",), outputs=("out.txt",))
+
+    def run_step_count(self):
+        """Run the pipeline with the copy step, returning how often the step ran"""
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertTrue(run_pipeline([self.step]))
+        log = Path('runs.log')
+        runs = len(log.read_text().split()) if log.exists() else 0
+        log.unlink(missing_ok=True)
+        return runs
+
+    def test_unchanged_files_skip_the_step(self):
+        self.assertEqual(self.run_step_count(), 1)
+        self.assertEqual(self.run_step_count(), 0)
+
+    def test_input_with_old_timestamp_reruns_the_step(self):
+        self.run_step_count()
+        new_input = self.tmp_path / 'in' / 'b.txt'
+        new_input.write_text('b')
+        os.utime(new_input, (0, 0))  # Copied in with its original 1970 timestamp
+        self.assertEqual(self.run_step_count(), 1)
+        self.assertEqual(Path('out.txt').read_text(), 'a.txt\nb.txt')
+
+    def test_removed_input_reruns_the_step(self):
+        (self.tmp_path / 'in' / 'b.txt').write_text('b')
+        self.run_step_count()
+        (self.tmp_path / 'in' / 'b.txt').unlink()
+        self.assertEqual(self.run_step_count(), 1)
+        self.assertEqual(Path('out.txt').read_text(), 'a.txt')
+
+    def test_removed_output_reruns_the_step(self):
+        self.run_step_count()
+        Path('out.txt').unlink()
+        self.assertEqual(self.run_step_count(), 1)
+
+    def test_step_without_outputs_always_runs(self):
+        self.step = Step("1", "Copy", "copy_step.py", "Copy step")
+        self.assertEqual(self.run_step_count(), 1)
+        self.assertEqual(self.run_step_count(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()